@@ -0,0 +1,134 @@
+import array
+import struct
+
+from logger import log
+from fileutils import BinaryFileUtil
+
+# Raw ADC traces: the probe buffers of real measurement cycles, recorded on
+# the device and replayed anywhere through AADC.
+#
+# File layout, little endian:
+#   header  "ADCT", version u16, reserved u16
+#   cycle   timestamp u32 (time.time()), period_us u32, count u16,
+#           flags u16 (acquisition mode), then count u16 samples
+# Samples are the probe values as _do_measurement produced them (after
+# oversampling, before any sample filter), so a replay with oversample=1
+# feeds the pipeline exactly what the device saw.
+
+MAGIC = b"ADCT"
+VERSION = 1
+_FILE_HEADER = "<4sHH"
+_CYCLE_HEADER = "<IIHH"
+FILE_HEADER_SIZE = struct.calcsize(_FILE_HEADER)
+CYCLE_HEADER_SIZE = struct.calcsize(_CYCLE_HEADER)
+
+class TraceRecorder:
+    # Appends one cycle per record() call. Recording stops once the file would
+    # grow past max_bytes, so a forgotten recorder cannot fill the flash.
+    def __init__(self, path : str, max_bytes : int = 256 * 1024) -> None :
+        self._file = BinaryFileUtil(path)
+        self._max_bytes : int = max_bytes
+        self._header = bytearray(CYCLE_HEADER_SIZE)
+        self._size : int = self._file.size()
+        self.cycles : int = 0
+        self.full : bool = False
+
+    def record(self, samples, period_us : int, timestamp : int, flags : int = 0) -> bool :
+        if self.full:
+            return False
+        count = len(samples)
+        needed = CYCLE_HEADER_SIZE + 2 * count + (FILE_HEADER_SIZE if self._size <= 0 else 0)
+        if self._size + needed > self._max_bytes:
+            self.full = True
+            log.warning("ADC trace %s reached %d bytes, recording stopped", self._file.path, self._size)
+            return False
+
+        if self._size <= 0:
+            self._size = self._file.append(struct.pack(_FILE_HEADER, MAGIC, VERSION, 0))
+        struct.pack_into(_CYCLE_HEADER, self._header, 0, timestamp, period_us, count, flags)
+        self._size += self._file.append(self._header, samples)
+        self.cycles += 1
+        return True
+
+class TraceReader:
+    # Streams the cycles of a trace file. next_cycle() refills one reusable
+    # buffer, so reading a long trace allocates nothing per cycle.
+    def __init__(self, path : str, max_count : int = 1024) -> None :
+        self._path = path
+        self._samples = array.array('H', (0 for _ in range(max_count)))
+        self._view = memoryview(self._samples)
+        self._header = bytearray(CYCLE_HEADER_SIZE)
+        self._file = None
+        self.timestamp : int = 0
+        self.period_us : int = 0
+        self.flags : int = 0
+        self.count : int = 0
+        self.index : int = -1  # Cycle currently in samples()
+        self.rewind()
+
+    def rewind(self) :
+        self.close()
+        self._file = open(self._path, "rb")
+        magic, version, _ = struct.unpack(_FILE_HEADER, self._file.read(FILE_HEADER_SIZE))
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError("not an ADC trace: %s" % self._path)
+        self.index = -1
+        self.count = 0
+
+    def close(self) :
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def next_cycle(self) -> bool :
+        # False at the end of the trace
+        if self._file.readinto(self._header) != CYCLE_HEADER_SIZE:
+            return False
+        self.timestamp, self.period_us, count, self.flags = struct.unpack(_CYCLE_HEADER, self._header)
+        if count > len(self._samples):
+            raise ValueError("cycle of %d samples exceeds max_count" % count)
+        nbytes = 2 * count
+        if self._file.readinto(self._view[:count]) != nbytes:
+            raise ValueError("truncated ADC trace: %s" % self._path)
+        self.count = count
+        self.index += 1
+        return True
+
+    def samples(self) -> memoryview :
+        return self._view[:self.count]
+
+class TraceReplay:
+    # ADC stand-in for AADC(TraceReplay(path)): read_u16() returns the recorded
+    # samples in order with no pacing, so replays run as fast as the pipeline.
+    # With auto_advance the cycles run on as one stream and the trace repeats
+    # at its end. Without it a cycle ends by repeating its last sample until
+    # next_cycle() is called, which keeps every replayed measurement aligned
+    # with one recorded cycle even if it reads a different number of probes.
+    def __init__(self, path : str, auto_advance : bool = True, max_count : int = 1024) -> None :
+        self.reader = TraceReader(path, max_count)
+        self._auto_advance = auto_advance
+        self._position = 0
+        self._last = 0
+        self.replayed : int = 0  # Samples handed out
+        if not self.reader.next_cycle():
+            raise ValueError("empty ADC trace: %s" % path)
+
+    def next_cycle(self) -> bool :
+        # False once the trace is exhausted
+        self._position = 0
+        return self.reader.next_cycle()
+
+    def read_u16(self) -> int :
+        reader = self.reader
+        if self._position >= reader.count:
+            if not self._auto_advance:
+                return self._last
+            if not reader.next_cycle():
+                reader.rewind()
+                reader.next_cycle()
+            self._position = 0
+        self._last = reader.samples()[self._position]
+        self._position += 1
+        self.replayed += 1
+        return self._last
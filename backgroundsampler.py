@@ -0,0 +1,147 @@
+import _thread
+import asyncio
+import array
+import time
+
+from logger import log
+from soilmoisturesensor import SoilMoistureSensor
+from measurement import Measurement
+
+class SpscRing:
+    # Lock-free single-producer/single-consumer ring of u16 samples. Only the
+    # producer moves _head and only the consumer moves _tail, and a slot is
+    # written before _head is published, so no lock is needed across threads.
+    # One slot always stays empty to tell "full" from "empty".
+    def __init__(self, capacity : int) -> None :
+        self._size = capacity + 1
+        self._buf = array.array('H', (0 for _ in range(self._size)))
+        self._head = 0
+        self._tail = 0
+
+    def __len__(self) -> int :
+        return (self._head - self._tail) % self._size
+
+    def empty(self) -> bool :
+        return self._head == self._tail
+
+    def full(self) -> bool :
+        return (self._head + 1) % self._size == self._tail
+
+    def put(self, value : int) -> bool :  # Producer side
+        head = self._head
+        nxt = (head + 1) % self._size
+        if nxt == self._tail:
+            return False
+        self._buf[head] = value
+        self._head = nxt
+        return True
+
+    def get(self) -> int :  # Consumer side
+        tail = self._tail
+        if tail == self._head:
+            raise IndexError
+        value = self._buf[tail]
+        self._tail = (tail + 1) % self._size
+        return value
+
+    def drain_into(self, out, offset : int = 0) -> int :  # Consumer side
+        # Copies everything available (up to the room left in out) and returns the count
+        tail = self._tail
+        head = self._head
+        n = 0
+        limit = len(out) - offset
+        while tail != head and n < limit:
+            out[offset + n] = self._buf[tail]
+            tail = (tail + 1) % self._size
+            n += 1
+        self._tail = tail
+        return n
+
+class BackgroundSampler:
+    # Runs the acquisition of a SoilMoistureSensor on a second thread (the
+    # second core on RP2040) so probe timing is not disturbed by the asyncio
+    # networking stack. Samples cross over through an SpscRing that the asyncio
+    # side drains into the sensor's own buffer. The worker thread uses only
+    # time.sleep and the sensor, ticks are read on the asyncio side, so it
+    # runs under CPython threads on the host emulation as well.
+    def __init__(self, sensor : SoilMoistureSensor, probe_count : int = 40, probe_interval : float = 0.005,
+                 drain_interval : float = 0.05) -> None :
+        self._sensor = sensor
+        self._probe_count : int = probe_count
+        self._probe_interval : float = probe_interval
+        self._drain_interval : float = drain_interval
+        self._ring = SpscRing(probe_count)
+
+        self._buffer = sensor.sample_buffer(probe_count)
+        self._requested = False
+        self._running = False
+        self._error = None
+
+    def start(self) :
+        if self._running:
+            return
+        self._running = True
+        _thread.start_new_thread(self._worker, ())
+
+    def stop(self) :
+        # The worker notices on its next poll and exits
+        self._running = False
+
+    def _acquire(self) :
+        sensor = self._sensor
+        ring = self._ring
+        sensor.sensor_power.value(1)
+        try:
+            time.sleep(sensor.settle_time)  # Wait for sensor to stabilize
+            for _ in range(self._probe_count):
+                value = sensor.read_probe()
+                while not ring.put(value):  # Consumer is behind, never drop a sample
+                    time.sleep(0)
+                time.sleep(self._probe_interval)
+        finally:
+            sensor.sensor_power.value(0)
+
+    def _worker(self) :
+        while self._running:
+            if not self._requested:
+                time.sleep(self._drain_interval)
+                continue
+            try:
+                self._acquire()
+            except Exception as e:
+                self._error = e
+            self._requested = False
+
+    async def measure(self) -> Measurement :
+        start = time.ticks_ms()
+        percent = await self.measure_soil_moisture()
+        sensor = self._sensor
+        return Measurement(int(time.time()), sensor.last_raw_level, percent, sensor.last_spread, sensor.last_probe_count,
+                           time.ticks_diff(time.ticks_ms(), start))
+
+    async def measure_soil_moisture(self) -> int :
+        if not self._running:
+            raise Exception("Background sampler is not running")
+        if self._requested:
+            raise Exception("Background measurement already in progress")
+
+        self._error = None
+        self._requested = True
+        received = 0
+        while received < self._probe_count:
+            received += self._ring.drain_into(self._buffer, received)
+            if received < self._probe_count:
+                if self._error is not None:
+                    raise self._error
+                if not self._requested and self._ring.empty():
+                    raise Exception("Background acquisition ended early")
+                await asyncio.sleep(self._drain_interval)
+
+        while self._requested:  # The worker still powers the probe off, it takes no request until then
+            await asyncio.sleep(self._drain_interval)
+        if self._error is not None:
+            raise self._error
+
+        log.debug("Background sampler delivered %d probes", received)
+        raw_moisture_probes = self._sensor.finish_measurement(received, self._probe_count)
+        return self._sensor.moisture_percentage(raw_moisture_probes)
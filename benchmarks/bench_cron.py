@@ -0,0 +1,23 @@
+# Evaluation of lib/sched cron specifiers: seconds to the next matching time
+
+import harness
+from sched.cron import cron
+
+T0 = 1767225600 + 3 * 86400 + 15 * 3600 + 20 * 60  # Sunday 2026-01-04 15:20:00 UTC
+
+def _construct():
+    return cron(wday=(0, 5), hrs=(1, 10), mins=range(0, 60, 15))
+
+def run(bench):
+    suite = "cron"
+    daily = cron(hrs=3, mins=0)
+    quarter_hours = cron(wday=(0, 5), hrs=(1, 10), mins=range(0, 60, 15))
+    month_end = cron(month=(4, 6, 9, 11), mday=30, hrs=23, mins=59)
+
+    bench.run(suite, "construct", _construct)
+    bench.run(suite, "daily", daily, T0)
+    bench.run(suite, "weekdays quarter hours", quarter_hours, T0)
+    bench.run(suite, "month end", month_end, T0)
+
+if __name__ == "__main__":
+    harness.main(run)
@@ -0,0 +1,41 @@
+# kernels.py against the pure Python reference versions.
+#   micropython benchmarks/bench_kernels.py    (unix port, viper/native kernels)
+#   python3 benchmarks/bench_kernels.py        (CPython, fallback only)
+
+import array
+
+import harness
+import kernels
+
+SAMPLES = 1024
+
+def _reference_histogram(data, counts):
+    kernels.py_histogram_u16(data, counts, 4)
+
+def _kernel_histogram(data, counts):
+    kernels.histogram_u16(data, counts, 4)
+
+def run(bench):
+    data = harness.make_samples(SAMPLES)
+    counts = array.array('H', (0 for _ in range(4096)))
+
+    # Kernels must agree with the reference before their timing means anything
+    assert kernels.py_sum_u16(data) == kernels.sum_u16(data), "sum_u16"
+    assert kernels.py_minmax_u16(data) == kernels.minmax_u16(data), "minmax_u16"
+    assert kernels.py_sumsq_u16(data) == kernels.sumsq_u16(data), "sumsq_u16"
+    expected = array.array('H', (0 for _ in range(4096)))
+    _reference_histogram(data, expected)
+    _kernel_histogram(data, counts)
+    assert expected == counts, "histogram_u16"
+
+    suite = "kernels" if kernels.NATIVE else "kernels-py"
+    for name, reference, kernel, args in (
+            ("sum_u16", kernels.py_sum_u16, kernels.sum_u16, (data,)),
+            ("minmax_u16", kernels.py_minmax_u16, kernels.minmax_u16, (data,)),
+            ("sumsq_u16", kernels.py_sumsq_u16, kernels.sumsq_u16, (data,)),
+            ("histogram_u16", _reference_histogram, _kernel_histogram, (data, counts))):
+        bench.run(suite, name + " ref", reference, *args)
+        bench.run(suite, name, kernel, *args)
+
+if __name__ == "__main__":
+    harness.main(run)
@@ -0,0 +1,51 @@
+# mathutils statistics over a measurement-sized u16 buffer.
+# Sorting cases refill a scratch buffer first, that copy is part of the timing.
+
+import array
+
+import harness
+from mathutils import (percentile, average, variance, isqrt, sort_in_place, SampleStats, Histogram,
+                       RunningStats, BACKEND)
+
+SAMPLES = 640  # probe_count 40 x oversample 16
+
+def _refill(scratch, data):
+    scratch[:] = data
+
+def _sort(scratch, data):
+    scratch[:] = data
+    sort_in_place(scratch)
+
+def _stats_sorted(scratch, data):
+    scratch[:] = data
+    SampleStats(scratch, (25, 50, 75, 95))
+
+def _stats_histogram(data, histogram):
+    histogram.reset()
+    SampleStats(data, (25, 50, 75, 95), histogram)
+
+def _running(data, stats):
+    stats.reset()
+    for value in data:
+        stats.add(value)
+
+def run(bench):
+    suite = "mathutils"
+    data = harness.make_samples(SAMPLES)
+    scratch = array.array('H', data)
+    histogram = Histogram()
+    print("mathutils backend: {}".format(BACKEND))
+
+    bench.run(suite, "average", average, data)
+    bench.run(suite, "variance", variance, data)
+    bench.run(suite, "buffer refill (baseline)", _refill, scratch, data)
+    bench.run(suite, "percentile", percentile, data, 95)
+    bench.run(suite, "sort_in_place", _sort, scratch, data)
+    bench.run(suite, "SampleStats", SampleStats, data)
+    bench.run(suite, "SampleStats quantiles sort", _stats_sorted, scratch, data)
+    bench.run(suite, "SampleStats quantiles hist", _stats_histogram, data, histogram)
+    bench.run(suite, "RunningStats add x640", _running, data, RunningStats())
+    bench.run(suite, "isqrt", isqrt, 123456789)
+
+if __name__ == "__main__":
+    harness.main(run)
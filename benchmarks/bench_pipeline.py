@@ -0,0 +1,54 @@
+# Post-processing of one measurement: SoilMoistureSensor.finish_measurement
+# (sample filter) and moisture_percentage (spread, estimator, calibration),
+# as _do_measurement runs them once the probes are in. Each call first
+# refills the sample buffer with the same raw probes.
+
+import asyncio
+
+import harness
+from soilmoisturesensor import SoilMoistureSensor
+from samplefilters import FilterChain, HampelFilter, MedianOfMeans
+
+PROBES = 40
+
+class _ScriptedSource:
+    # Stands in for AADC: returns a fixed level, enough to calibrate against
+    def __init__(self) -> None :
+        self.level = 0
+
+    def read_u16(self, last=False):
+        return self.level
+
+    def read_oversampled(self, oversample=1):
+        return self.level
+
+class _PowerPin:
+    def value(self, level=None):
+        return 0
+
+def _sensor(**kwargs):
+    source = _ScriptedSource()
+    sensor = SoilMoistureSensor(source, _PowerPin(), probe_count=PROBES, probe_interval=0, settle_time=0, **kwargs)
+    source.level = 52000
+    asyncio.run(sensor.calibrate_dry_soil())
+    source.level = 21000
+    asyncio.run(sensor.calibrate_wet_soil())
+    return sensor
+
+def _process(sensor, raw):
+    buffer = sensor.sample_buffer(PROBES)
+    buffer[:] = raw
+    sensor.moisture_percentage(sensor.finish_measurement(PROBES, PROBES))
+
+def run(bench):
+    suite = "pipeline"
+    raw = harness.make_samples(PROBES, base=30000, spread=2048)
+    raw[7] = 60000  # One glitch for the Hampel filter to catch
+
+    bench.run(suite, "mean estimate", _process, _sensor(), raw)
+    bench.run(suite, "hampel + median-of-means", _process,
+              _sensor(sample_filter=FilterChain(HampelFilter(window=7)),
+                      estimator=MedianOfMeans(group_size=8, max_groups=5)), raw)
+
+if __name__ == "__main__":
+    harness.main(run)
@@ -0,0 +1,119 @@
+# MQTT packet encoding and decoding in lib/umqtt/simple.py and
+# simple_async.py. Publishes go to a socket or stream that discards
+# everything and answers QoS 1 with its PUBACK straight away; the receive
+# cases parse the same inbound command publish over and over.
+
+import json
+
+import harness
+from umqtt.simple import MQTTClient
+from umqtt import simple_async
+
+class _SinkSocket:
+    def __init__(self, client) -> None :
+        self._client = client
+        self._reply = b""
+        self.writes = 0
+
+    def write(self, data, length=-1):
+        self.writes += 1
+        return len(data) if length < 0 else length
+
+    def readinto(self, buf):
+        # The client reads after every packet was consumed, so buf always has room
+        pid = self._client.pid
+        buf[0] = 0x40
+        buf[1] = 0x02
+        buf[2] = pid >> 8 & 0xFF
+        buf[3] = pid & 0xFF
+        return 4
+
+    def setblocking(self, flag):
+        pass
+
+class _SinkStream:
+    # Never has to wait, so a coroutine using it runs to completion in one step
+    def __init__(self, socket) -> None :
+        self._socket = socket
+
+    def write(self, data):
+        self._socket.write(data)
+
+    async def drain(self):
+        pass
+
+    async def readinto(self, buf):
+        return self._socket.readinto(buf)
+
+class _SourceSocket:
+    # Every read returns one complete packet
+    def __init__(self, packet) -> None :
+        self._packet = packet
+
+    def readinto(self, buf):
+        n = len(self._packet)
+        buf[:n] = self._packet
+        return n
+
+    def write(self, data, length=-1):
+        return len(data) if length < 0 else length
+
+    def setblocking(self, flag):
+        pass
+
+def _drive(coro):
+    try:
+        coro.send(None)
+    except StopIteration as stop:
+        return stop.value
+    raise Exception("coroutine suspended")
+
+def _discovery_payload() -> str :
+    components = {}
+    for probe in range(3):
+        name = "HD_38_soil_moisture_sensor_%d" % (probe + 1)
+        components[name] = {"unique_id": name, "platform": "sensor", "device_class": "moisture",
+                            "unit_of_measurement": "%", "state_topic": "soil-quality-monitor/%s/state" % name}
+    return json.dumps({"device": {"identifiers": "soil-quality-monitor", "name": "soil-quality-monitor",
+                                  "manufacturer": "TheSonOfDeimos", "model": "Raspberry Pi Pico W"},
+                       "origin": {"name": "SQM OS", "sw_version": "1.0"}, "components": components})
+
+def run(bench):
+    suite = "umqtt"
+    client = MQTTClient("soil-quality-monitor", "localhost", keepalive=5)
+    client.sock = _SinkSocket(client)
+    # Encoded once up front, as HomeAssistantClient does
+    state_topic = b"soil-quality-monitor/HD_38_soil_moisture_sensor/state"
+    discovery_topic = b"homeassistant/device/soil-quality-monitor/config"
+    discovery = _discovery_payload().encode()
+
+    bench.run(suite, "publish state qos0", client.publish, state_topic, b"42.0", True, 0)
+    bench.run(suite, "publish state qos1", client.publish, state_topic, b"42.0", True, 1)
+    client.pid = 0  # umqtt.simple does not wrap packet ids at 65535
+    bench.run(suite, "publish discovery qos1", client.publish, discovery_topic, discovery, True, 1)
+    bench.run(suite, "ping", client.ping)
+
+    # Without a timeout no task is spawned per reply, so no event loop is needed
+    client = simple_async.MQTTClient("soil-quality-monitor", "localhost", keepalive=5, timeout=None)
+    client.reader = client.writer = _SinkStream(_SinkSocket(client))
+    bench.run(suite, "async publish state qos0", lambda: _drive(client.publish(state_topic, b"42.0", True, 0)))
+    bench.run(suite, "async publish state qos1", lambda: _drive(client.publish(state_topic, b"42.0", True, 1)))
+    bench.run(suite, "async publish discovery qos1", lambda: _drive(client.publish(discovery_topic, discovery, True, 1)))
+
+
+    # An inbound QoS 1 command, acknowledged by the client
+    topic = b"soil-quality-monitor/command"
+    payload = b'{"action": "measure"}'
+    command = bytes((0x32, 2 + len(topic) + 2 + len(payload), 0, len(topic))) + topic + b"\x00\x07" + payload
+    client = MQTTClient("soil-quality-monitor", "localhost", keepalive=5)
+    client.set_callback(lambda topic, msg: None)
+    client.sock = _SourceSocket(command)
+    bench.run(suite, "receive command qos1", client.wait_msg)
+
+    client = simple_async.MQTTClient("soil-quality-monitor", "localhost", keepalive=5, timeout=None)
+    client.set_callback(lambda topic, msg: None)
+    client.reader = client.writer = _SinkStream(_SourceSocket(command))
+    bench.run(suite, "async receive command qos1", lambda: _drive(client.wait_msg()))
+
+if __name__ == "__main__":
+    harness.main(run)
@@ -0,0 +1,53 @@
+# Request handling helpers of the captive portal in microwebserver.py:
+# the DNS catch-all answer and HTTP request parsing from a client socket.
+
+import harness
+import microwebserver
+
+# A-record query for connectivitycheck.gstatic.com
+DNS_QUERY = (b"\x1a\x2b\x01\x00\x00\x01\x00\x00\x00\x00\x00\x00"
+             b"\x11connectivitycheck\x07gstatic\x03com\x00\x00\x01\x00\x01")
+
+HTTP_GET = (b"GET /join?ssid=My%20Home+Network&x=1 HTTP/1.1\r\n"
+            b"Host: 192.168.4.1\r\n"
+            b"User-Agent: Mozilla/5.0 (Linux; Android 14) AppleWebKit/537.36 Chrome/126.0 Mobile Safari/537.36\r\n"
+            b"Accept: text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8\r\n"
+            b"Accept-Language: en-GB,en;q=0.9\r\n"
+            b"Connection: keep-alive\r\n\r\n")
+
+HTTP_POST_BODY = b"ssid=My+Home+Network&password=correct%20horse%20battery&strict=on"
+HTTP_POST = (b"POST /test-credentials HTTP/1.1\r\n"
+             b"Host: 192.168.4.1\r\n"
+             b"Content-Type: application/x-www-form-urlencoded\r\n"
+             b"Content-Length: " + str(len(HTTP_POST_BODY)).encode() + b"\r\n\r\n" + HTTP_POST_BODY)
+
+class _ClientSocket:
+    # Replays one request through recv(), in chunks as a TCP stream might deliver it
+    def __init__(self, request : bytes) -> None :
+        self._request = request
+        self._offset = 0
+
+    def rewind(self):
+        self._offset = 0
+        return self
+
+    def settimeout(self, timeout):
+        pass
+
+    def recv(self, n):
+        data = self._request[self._offset:self._offset + n]
+        self._offset += len(data)
+        return data
+
+def _read(conn):
+    microwebserver.read_http_request(conn.rewind())
+
+def run(bench):
+    suite = "webserver"
+    bench.run(suite, "build_dns_response", microwebserver.build_dns_response, DNS_QUERY, "192.168.4.1")
+    bench.run(suite, "read_http_request GET", _read, _ClientSocket(HTTP_GET))
+    bench.run(suite, "read_http_request POST", _read, _ClientSocket(HTTP_POST))
+    bench.run(suite, "parse_form_urlencoded", microwebserver.parse_form_urlencoded, HTTP_POST_BODY.decode())
+
+if __name__ == "__main__":
+    harness.main(run)
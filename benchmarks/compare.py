@@ -0,0 +1,33 @@
+# Compares two result files written by benchmarks/run.py:
+#   python3 benchmarks/compare.py baseline.json candidate.json
+# Prints the throughput ratio (candidate / baseline), p99 and allocation
+# changes of every benchmark present in both runs.
+
+import json
+import sys
+
+def _load(path : str) -> dict :
+    with open(path) as f:
+        document = json.load(f)
+    return {(r["suite"], r["name"]): r for r in document["results"]}
+
+def main():
+    if len(sys.argv) != 3:
+        print("usage: compare.py baseline.json candidate.json")
+        sys.exit(2)
+    baseline = _load(sys.argv[1])
+    candidate = _load(sys.argv[2])
+
+    print("{:<10} {:<28} {:>9} {:>19} {:>17}".format("suite", "benchmark", "speedup", "p99 us", "alloc B"))
+    for key, new in candidate.items():
+        old = baseline.get(key)
+        if old is None:
+            continue
+        speedup = new["ops_per_sec"] / old["ops_per_sec"] if old["ops_per_sec"] else 0
+        print("{:<10} {:<28} {:>8.2f}x {:>9.2f} -> {:<7.2f} {:>7} -> {:<7}".format(
+            key[0], key[1], speedup, old["p99_us"], new["p99_us"], old["alloc_bytes"], new["alloc_bytes"]))
+    for key in baseline:
+        if key not in candidate:
+            print("{:<10} {:<28} missing from candidate".format(*key))
+
+main()
@@ -0,0 +1,170 @@
+# Shared benchmark harness, runs on CPython and the MicroPython unix port.
+#
+# Every case is timed in rounds of `inner` back-to-back calls, `inner` chosen
+# so a round lasts about TARGET_US; the per-call time of each round is one
+# latency sample for the p50/p99 figures. Allocation is measured in a separate
+# pass so tracing does not skew the timings:
+#   MicroPython  heap bytes allocated per call (gc.mem_alloc with gc disabled)
+#   CPython      peak traced bytes during one call (tracemalloc)
+#
+# On CPython the host emulation is installed first, so modules that import
+# machine or network load unmodified. Benchmark timing always uses the host
+# clock, never the emulated one.
+
+import sys
+import gc
+
+try:
+    import json
+except ImportError:
+    import ujson as json
+
+MICROPYTHON = sys.implementation.name == "micropython"
+
+_here = __file__.rsplit("/", 1)[0] if "/" in __file__ else "."
+for _path in (_here + "/../lib", _here + "/.."):
+    if _path not in sys.path:
+        sys.path.insert(0, _path)
+
+if MICROPYTHON:
+    from time import ticks_us, ticks_diff, time as _wall_time
+
+    def now_us():
+        return ticks_us()
+
+    def elapsed_us(start):
+        return ticks_diff(ticks_us(), start)
+else:
+    from time import perf_counter, time as _wall_time
+    import tracemalloc
+    import emulation
+    emulation.install()
+
+    def now_us():
+        return perf_counter() * 1000000
+
+    def elapsed_us(start):
+        return perf_counter() * 1000000 - start
+
+ROUNDS = 50
+TARGET_US = 2000
+ALLOC_CALLS = 20
+
+def make_samples(n : int, base : int = 30000, spread : int = 4096, seed : int = 12345):
+    # Deterministic u16 samples, identical on every port
+    import array
+    data = array.array('H', (0 for _ in range(n)))
+    for i in range(n):
+        seed = (seed * 1103515245 + 12345) & 0x7FFFFFFF
+        data[i] = base + (seed >> 16) % spread
+    return data
+
+def _percentile(ordered, q) -> float :
+    index = (len(ordered) - 1) * q / 100
+    lo = int(index)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (index - lo)
+
+class Bench:
+    def __init__(self, rounds : int = ROUNDS, target_us : int = TARGET_US) -> None :
+        self.rounds = rounds
+        self.target_us = target_us
+        self.results = []
+        self.skipped = []
+
+    def _calibrate(self, func, args) -> int :
+        inner = 1
+        while inner < 1 << 20:
+            start = now_us()
+            for _ in range(inner):
+                func(*args)
+            if elapsed_us(start) >= self.target_us:
+                break
+            inner <<= 1
+        return inner
+
+    def _alloc_per_call(self, func, args) -> int :
+        if MICROPYTHON:
+            gc.collect()
+            gc.disable()
+            try:
+                before = gc.mem_alloc()
+                for _ in range(ALLOC_CALLS):
+                    func(*args)
+                return (gc.mem_alloc() - before) // ALLOC_CALLS
+            finally:
+                gc.enable()
+        tracemalloc.start()
+        try:
+            peak = 0
+            for _ in range(ALLOC_CALLS):
+                current = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+                func(*args)
+                peak = max(peak, tracemalloc.get_traced_memory()[1] - current)
+            return peak
+        finally:
+            tracemalloc.stop()
+
+    def run(self, suite : str, name : str, func, *args) :
+        func(*args)  # Warm up, also surfaces errors before timing
+        inner = self._calibrate(func, args)
+        samples = []
+        total = 0
+        for _ in range(self.rounds):
+            start = now_us()
+            for _ in range(inner):
+                func(*args)
+            per_call = elapsed_us(start) / inner
+            samples.append(per_call)
+            total += per_call
+        samples.sort()
+        mean = total / self.rounds
+        result = {
+            "suite": suite,
+            "name": name,
+            "ops_per_sec": 1000000 / mean if mean else 0,
+            "mean_us": mean,
+            "p50_us": _percentile(samples, 50),
+            "p99_us": _percentile(samples, 99),
+            "alloc_bytes": self._alloc_per_call(func, args),
+            "rounds": self.rounds,
+            "inner": inner,
+        }
+        self.results.append(result)
+        print("{:<10} {:<28} {:>12.0f} {:>10.2f} {:>10.2f} {:>8}".format(
+            suite, name, result["ops_per_sec"], result["p50_us"], result["p99_us"], result["alloc_bytes"]))
+        return result
+
+    def skip(self, suite : str, reason) :
+        self.skipped.append({"suite": suite, "reason": str(reason)})
+        print("{:<10} skipped: {}".format(suite, reason))
+
+    def header(self) :
+        print("{} {} ({})".format(sys.implementation.name, sys.version.split()[0], sys.platform))
+        print("{:<10} {:<28} {:>12} {:>10} {:>10} {:>8}".format(
+            "suite", "benchmark", "ops/s", "p50 us", "p99 us", "alloc B"))
+
+    def write(self, path : str) :
+        document = {
+            "implementation": sys.implementation.name,
+            "version": sys.version.split()[0],
+            "platform": sys.platform,
+            "time": int(_wall_time()),
+            "alloc_method": "gc.mem_alloc" if MICROPYTHON else "tracemalloc-peak",
+            "results": self.results,
+            "skipped": self.skipped,
+        }
+        with open(path, "w") as f:
+            json.dump(document, f)
+        print("Results written to {}".format(path))
+
+def main(run, path : str = None) :
+    # Entry point for running one suite module on its own
+    bench = Bench()
+    bench.header()
+    run(bench)
+    if path is None and len(sys.argv) > 1:
+        path = sys.argv[1]
+    if path is not None:
+        bench.write(path)
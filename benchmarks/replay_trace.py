@@ -0,0 +1,79 @@
+# Pushes every cycle of a recorded ADC trace (see adctrace.py) through the
+# full measurement pipeline at unbounded speed:
+#   python3 benchmarks/replay_trace.py trace.adct [plain|robust] [results.csv]
+# Each recorded cycle becomes one SoilMoistureSensor.measure() reading from
+# AADC(TraceReplay) of exactly that cycle's sample count, so filters and
+# estimators see the recorded probes and nothing else. The CSV (cycle, timestamp, count, raw level, percent, spread) of
+# two runs can be diffed for regressions. Calibration is loaded from the
+# working directory like on the device (HD-38-sensor-calibration.*).
+
+import sys
+import asyncio
+
+import harness
+from primitives.aadc import AADC
+from adctrace import TraceReader, TraceReplay
+from soilmoisturesensor import SoilMoistureSensor
+from samplefilters import FilterChain, HampelFilter, MedianOfMeans
+
+class _PowerPin:
+    def value(self, level=None):
+        return 0
+
+def _pipeline(name : str, probe_count : int) -> dict :
+    if name == "plain":
+        return {}
+    if name == "robust":  # As configured in main.py
+        return {"sample_filter": FilterChain(HampelFilter(window=7)),
+                "estimator": MedianOfMeans(group_size=8, max_groups=(probe_count + 7) // 8)}
+    raise ValueError("unknown pipeline %s" % name)
+
+def _longest_cycle(path : str) -> int :
+    reader = TraceReader(path)
+    longest = 0
+    while reader.next_cycle():
+        longest = max(longest, reader.count)
+    reader.close()
+    return longest
+
+async def _replay(sensor, replay, out) -> int :
+    cycles = 0
+    while True:
+        reader = replay.reader
+        measurement = await sensor.measure(reader.count)
+        if out is not None:
+            out.write("%d,%d,%d,%d,%d,%d\n" % (reader.index, reader.timestamp, reader.count,
+                                              measurement.raw_mean, measurement.percent, measurement.spread))
+        cycles += 1
+        if not replay.next_cycle():
+            return cycles
+
+def main():
+    if len(sys.argv) < 2:
+        print("usage: replay_trace.py trace.adct [plain|robust] [results.csv]")
+        sys.exit(2)
+    path = sys.argv[1]
+    pipeline = sys.argv[2] if len(sys.argv) > 2 else "robust"
+    probe_count = _longest_cycle(path)  # Sizes the sample buffer, each cycle reads its own count
+
+    replay = TraceReplay(path, auto_advance=False)
+    sensor = SoilMoistureSensor(AADC(replay), _PowerPin(), probe_count=probe_count, mode=SoilMoistureSensor.BURST,
+                                settle_time=0, **_pipeline(pipeline, probe_count))
+    if not sensor.load_calibration_settings():
+        print("No calibration in the working directory, percentages use the full ADC range")
+
+    out = open(sys.argv[3], "w") if len(sys.argv) > 3 else None
+    try:
+        if out is not None:
+            out.write("cycle,timestamp,count,raw_level,percent,spread\n")
+        start = harness.now_us()
+        cycles = asyncio.run(_replay(sensor, replay, out))
+        elapsed = harness.elapsed_us(start) / 1000000
+    finally:
+        if out is not None:
+            out.close()
+
+    print("%s pipeline: %d cycles, %d samples in %.3f s (%.0f cycles/s)" % (
+        pipeline, cycles, replay.replayed, elapsed, cycles / elapsed if elapsed else 0))
+
+main()
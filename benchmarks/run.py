@@ -0,0 +1,27 @@
+# Runs every benchmark suite and writes the results as JSON.
+#   python3 benchmarks/run.py [results.json]
+#   micropython benchmarks/run.py [results.json]
+# Suites whose target cannot be imported on this port (no machine.ADC or
+# network module on the unix port) are listed as skipped in the results.
+# Compare two result files with benchmarks/compare.py.
+
+import sys
+
+import harness
+
+SUITES = ("bench_kernels", "bench_mathutils", "bench_pipeline", "bench_umqtt", "bench_webserver", "bench_cron")
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else "bench-results.json"
+    bench = harness.Bench()
+    bench.header()
+    for name in SUITES:
+        try:
+            suite = __import__(name)
+        except ImportError as e:
+            bench.skip(name, e)
+            continue
+        suite.run(bench)
+    bench.write(path)
+
+main()
@@ -0,0 +1,103 @@
+import array
+
+from logger import log
+from fileutils import BinaryFileUtil
+
+class CalibrationCurve:
+    # Piecewise-linear raw u16 -> moisture curve through N calibration points,
+    # compiled into an integer lookup table indexed by the top TABLE_BITS of the
+    # reading. Conversion is one shift, one mask, two table reads and an integer
+    # interpolation; results are in tenths of a percent (0..1000).
+    TABLE_BITS = 8
+    SCALE = 10  # LUT units per percent
+
+    _SHIFT = 16 - TABLE_BITS
+    _MASK = (1 << _SHIFT) - 1
+
+    def __init__(self, points = ()) -> None :
+        # Entry i holds the value at raw i << _SHIFT; the extra last entry closes the top segment
+        self._table = array.array('H', (0 for _ in range((1 << self.TABLE_BITS) + 1)))
+        self._points = []
+        for raw, percent in points:
+            self.add_point(raw, percent)
+
+    def points(self) -> list :
+        return [[raw, percent] for raw, percent in self._points]
+
+    def add_point(self, raw : int, percent : float) :
+        if raw < 0 or raw > 65535:
+            raise ValueError("raw value must fit in u16")
+        if percent < 0 or percent > 100:
+            raise ValueError("percent must be between 0 and 100")
+        # Recalibrating a percentage replaces its previous point; the rest must stay monotonic
+        points = [p for p in self._points if p[1] != percent]
+        points.append((raw, percent))
+        points.sort()
+        _check_monotonic(points)
+        self._points = points
+
+    def _percent_at(self, raw : int) -> float :
+        points = self._points
+        if raw <= points[0][0]:
+            return points[0][1]
+        for i in range(1, len(points)):
+            raw_hi, percent_hi = points[i]
+            if raw <= raw_hi:
+                raw_lo, percent_lo = points[i - 1]
+                return percent_lo + (percent_hi - percent_lo) * (raw - raw_lo) / (raw_hi - raw_lo)
+        return points[-1][1]
+
+    def compile(self) :
+        if len(self._points) < 2:
+            raise ValueError("calibration needs at least two points")
+        table = self._table
+        for i in range(len(table)):
+            table[i] = int(self._percent_at(i << self._SHIFT) * self.SCALE + 0.5)
+        log.debug("Calibration table compiled from %d points", len(self._points))
+
+    def convert(self, raw : int) -> int :
+        table = self._table
+        i = raw >> self._SHIFT
+        lo = table[i]
+        return lo + (((table[i + 1] - lo) * (raw & self._MASK)) >> self._SHIFT)
+
+    def convert_into(self, raw_data, out) :
+        # Bulk conversion, e.g. of a recorded history, straight into another array
+        table = self._table
+        shift = self._SHIFT
+        mask = self._MASK
+        for j in range(len(raw_data)):
+            raw = raw_data[j]
+            i = raw >> shift
+            lo = table[i]
+            out[j] = lo + (((table[i + 1] - lo) * (raw & mask)) >> shift)
+
+    def _points_key(self) -> array.array :
+        # Stored after the table, identifies the points it was compiled from
+        key = array.array('H')
+        for raw, percent in self._points:
+            key.append(raw)
+            key.append(int(percent * self.SCALE + 0.5))
+        return key
+
+    def save_table(self, file : BinaryFileUtil) :
+        file.rewrite(self._table)
+        file.append(self._points_key())
+
+    def load_table(self, file : BinaryFileUtil) -> bool :
+        # False, and the table must be compiled, if the file was compiled from other points or has none
+        key = self._points_key()
+        size = 2 * len(self._table)
+        if file.size() != size + 2 * len(key):
+            return False
+        stored = array.array('H', key)
+        if file.read_at(size, stored) != 2 * len(key) or stored != key:
+            return False
+        return file.read_at(0, self._table) == size
+
+def _check_monotonic(points : list) :
+    # Sorted by raw value: no raw value twice, percentages all rising or all falling
+    rising = points[-1][1] > points[0][1]
+    for i in range(1, len(points)):
+        if points[i][0] == points[i - 1][0] or (points[i][1] > points[i - 1][1]) != rising:
+            raise ValueError("calibration points must be monotonic")
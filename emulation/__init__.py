@@ -0,0 +1,110 @@
+# Host-side emulation of the Pico W, so the firmware runs unmodified under
+# CPython for profiling, benchmarks and load tests.
+#
+#   import emulation
+#   emulation.install()                 # before importing any firmware module
+#   emulation.board.set_adc(27, emulation.waveforms.Constant(30000), powered_by=26)
+#   emulation.run(main(), duration=3600)
+#
+# install() puts the emulated machine, network, rp2, micropython and time
+# modules in sys.modules (with their u-prefixed aliases) and fills in the
+# MicroPython-only asyncio and builtin names the firmware uses. All emulated
+# hardware runs on one VirtualClock; run() drives asyncio on the same clock,
+# so the firmware sees consistent time and sleeps cost no wall time.
+
+import asyncio
+import builtins
+import os
+import sys
+import warnings
+
+from emulation.clock import clock, VirtualClock
+from emulation.board import board, Board
+from emulation.runner import run, VirtualEventLoop
+from emulation.broker import MqttBroker
+from emulation import waveforms
+
+_installed = False
+
+class _ThreadSafeFlag:
+    # asyncio.ThreadSafeFlag: set() from a callback wakes one wait(), which clears it
+    def __init__(self) -> None :
+        self._event = asyncio.Event()
+
+    def set(self) :
+        self._event.set()
+
+    def clear(self) :
+        self._event.clear()
+
+    async def wait(self) :
+        await self._event.wait()
+        self._event.clear()
+
+class _StreamReader(asyncio.StreamReader):
+    # MicroPython wraps any object with a read()/ioctl() in StreamReader(obj);
+    # CPython's constructor takes a buffer limit. Only the construction is
+    # emulated, reading from such a wrapper is not.
+    def __init__(self, stream = None, *args, **kwargs) -> None :
+        if isinstance(stream, int) or stream is None:
+            super().__init__(*((stream,) if stream is not None else ()), *args, **kwargs)
+        else:
+            super().__init__()
+            self.stream = stream
+
+def _sleep_ms(ms : int) :
+    return asyncio.sleep(ms / 1000)
+
+_host_import = builtins.__import__
+
+def _import(name, globals = None, locals = None, fromlist = (), level : int = 0) :
+    # MicroPython resolves a relative import without globals against the
+    # calling module and accepts any true fromlist (lib/primitives relies on both)
+    if globals is None and level > 0:
+        globals = sys._getframe(1).f_globals
+    if fromlist is True:
+        fromlist = ("__name__",)
+    return _host_import(name, globals, locals, fromlist, level)
+
+def _print_exception(exc, file = None) :
+    import traceback
+    traceback.print_exception(type(exc), exc, exc.__traceback__, file=file)
+
+def install(flash_dir : str = None) :
+    # flash_dir becomes the working directory, where the firmware keeps its files
+    global _installed
+    if not _installed:
+        import binascii, json, select, socket, struct
+        from emulation import machine, network, rp2, micropython, utime
+
+        for name, module in (("machine", machine), ("network", network), ("rp2", rp2),
+                             ("micropython", micropython), ("time", utime), ("utime", utime),
+                             ("ujson", json), ("uos", os), ("uselect", select), ("usocket", socket),
+                             ("ustruct", struct), ("ubinascii", binascii), ("uasyncio", asyncio)):
+            sys.modules[name] = module
+
+        builtins.const = micropython.const
+        builtins.__import__ = _import
+        # lib/primitives creates a coroutine object only to learn its type
+        warnings.filterwarnings("ignore", "coroutine '_g' was never awaited")
+        asyncio.sleep_ms = _sleep_ms
+        if not hasattr(asyncio, "ThreadSafeFlag"):
+            asyncio.ThreadSafeFlag = _ThreadSafeFlag
+        asyncio.StreamReader = _StreamReader
+        if not hasattr(sys, "print_exception"):
+            sys.print_exception = _print_exception
+
+        # The firmware finds its libraries in /lib, next to the application modules
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        for path in (os.path.join(root, "lib"), root):
+            if path not in sys.path:
+                sys.path.insert(0, path)
+        _installed = True
+
+    if flash_dir is not None:
+        os.chdir(flash_dir)
+
+def reset() :
+    # Back to power on: clock at zero, board unwired
+    clock.reset()
+    board.reset()
@@ -0,0 +1,54 @@
+# Boots the unmodified main.py on the emulated board and lets it run for a
+# number of emulated hours (default 6):
+#   python -m emulation 24
+# The device starts uncalibrated: the button is pressed once on dry soil and
+# once after watering, then the soil slowly dries out while the firmware
+# measures and publishes to an in-process MQTT broker.
+
+import asyncio
+import os
+import runpy
+import sys
+import tempfile
+import time
+
+import emulation
+from emulation import board, clock, waveforms
+
+def main() :
+    hours = float(sys.argv[1]) if len(sys.argv) > 1 else 6
+    emulation.install(tempfile.mkdtemp(prefix="emulated-flash-"))
+
+    import umqtt.simple
+    broker = emulation.MqttBroker()
+    broker.patch(umqtt.simple)
+    broker.patch(asyncio)
+
+    # HD-38 on GP27, powered from GP26: reads dry (52000) until watered at 15 s,
+    # then dries from 21000 back towards 50000 with a two day time constant
+    soil = (waveforms.Steps([(15, 0)], initial=31000) + waveforms.Decay(21000, 50000, 2 * 86400, delay=60)
+            + waveforms.Noise(250) + waveforms.Spikes(0.005, 15000))
+    board.set_adc(27, soil, powered_by=26)
+    board.press(17, at=10)  # Calibration, dry soil
+    board.press(17, at=20)  # Calibration, wet soil
+
+    duration = hours * 3600
+
+    def run_emulated(coro) :
+        return emulation.run(coro, duration=duration)
+
+    asyncio.run = run_emulated
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    started = time.perf_counter()
+    runpy.run_path(os.path.join(root, "main.py"), run_name="__main__")
+    elapsed = time.perf_counter() - started
+
+    print("Emulated %.1f h in %.2f s of wall time (%.0fx real time)" % (
+        clock.now_us() / 3600000000, elapsed, clock.now_us() / 1000000 / max(elapsed, 1e-9)))
+    print("Broker: %d connections, %d messages, %d pings, %d bytes received" % (
+        broker.connects, len(broker.messages), broker.pings, broker.bytes_received))
+    for topic, message in sorted(broker.retained.items()):
+        if not topic.startswith("homeassistant/"):
+            print("  %s = %s" % (topic, message.payload.decode()))
+
+main()
@@ -0,0 +1,104 @@
+from emulation.clock import clock
+from emulation.waveforms import Constant
+
+class _PinState:
+    __slots__ = ("mode", "pull", "output", "external", "irq_handler", "irq_trigger", "irq_pin")
+
+    def __init__(self) -> None :
+        self.mode : int = -1
+        self.pull : int = -1
+        self.output : int = 0
+        self.external : int = -1  # Level driven from outside the chip, -1 if floating
+        self.irq_handler = None
+        self.irq_trigger : int = 0
+        self.irq_pin = None  # machine.Pin handed to the handler
+
+class Board:
+    # Everything around the emulated RP2040: levels driven onto the pins by
+    # the outside world, the analog inputs, PWM duties and the WiFi networks in
+    # range. Emulated machine/network objects keep their state here, so a
+    # script can poke the hardware without holding references to it.
+    PIN_OUT = 1
+    PULL_UP = 1
+
+    def __init__(self) -> None :
+        self.reset()
+
+    def reset(self) :
+        self._pins = {}
+        self._adc_sources = {}
+        self._pwm_duty = {}
+        self.networks : dict = {}  # ssid -> password of the access points in range, empty accepts any
+        self.wifi_connect_time : float = 2.0  # Seconds from WLAN.connect() to association
+        self.ip : str = "192.168.1.50"
+        self.adc_conversion_us : int = 2
+
+    def pin(self, gpio : int) -> _PinState :
+        state = self._pins.get(gpio)
+        if state is None:
+            state = self._pins[gpio] = _PinState()
+        return state
+
+    def level(self, gpio : int) -> int :
+        state = self.pin(gpio)
+        if state.mode == self.PIN_OUT:
+            return state.output
+        if state.external >= 0:
+            return state.external
+        return 1 if state.pull == self.PULL_UP else 0
+
+    def _set_level(self, gpio : int, change) :
+        # Applies change() and runs the pin IRQ when the level crossed the trigger edge
+        before = self.level(gpio)
+        change()
+        after = self.level(gpio)
+        state = self.pin(gpio)
+        if before != after and state.irq_handler is not None:
+            edge = 8 if after else 4  # Pin.IRQ_RISING, Pin.IRQ_FALLING
+            if state.irq_trigger & edge:
+                state.irq_handler(state.irq_pin)
+
+    def write(self, gpio : int, value : int) :
+        # Level written by firmware to an output pin
+        def change():
+            self.pin(gpio).output = 1 if value else 0
+        self._set_level(gpio, change)
+
+    def drive(self, gpio : int, level : int) :
+        # Level forced onto an input pin from outside, -1 lets it float again
+        def change():
+            self.pin(gpio).external = level
+        self._set_level(gpio, change)
+
+    def release(self, gpio : int) :
+        self.drive(gpio, -1)
+
+    def press(self, gpio : int, at : float, duration : float = 0.2, active_level : int = 0) :
+        # Scripts a button press `at` seconds of emulated time from now
+        start = clock.now_us() + int(at * 1000000)
+        clock.call_at(start, lambda: self.drive(gpio, active_level))
+        clock.call_at(start + int(duration * 1000000), lambda: self.release(gpio))
+
+    def set_adc(self, gpio : int, waveform, powered_by : int = -1) :
+        # waveform is a Waveform or a plain level. With powered_by the input
+        # reads 0 while that output pin is low, like a probe on a switched supply.
+        if not callable(waveform):
+            waveform = Constant(waveform)
+        self._adc_sources[gpio] = (waveform, powered_by)
+
+    def adc_value(self, gpio : int) -> int :
+        source = self._adc_sources.get(gpio)
+        if source is None:
+            return 0
+        waveform, powered_by = source
+        if powered_by >= 0 and not self.level(powered_by):
+            return 0
+        return min(max(int(waveform(clock.now_us())), 0), 65535)
+
+    def set_pwm_duty(self, gpio : int, duty_u16 : int) :
+        self._pwm_duty[gpio] = duty_u16
+
+    def pwm_duty(self, gpio : int) -> int :
+        return self._pwm_duty.get(gpio, -1)
+
+board = Board()
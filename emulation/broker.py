@@ -0,0 +1,376 @@
+import asyncio
+import errno
+
+from emulation.clock import clock
+
+# In-process MQTT 3.1.1 broker behind an emulated socket module. Clients
+# talk to it through ordinary socket calls or asyncio streams, every packet
+# is answered as soon as it is written, and published messages are recorded
+# for inspection:
+#   broker = MqttBroker()
+#   broker.patch(umqtt.simple)      # the module's `socket` now reaches the broker
+#   broker.patch(asyncio)           # and so does asyncio.open_connection
+#   ... run the firmware ...
+#   broker.retained["soil-quality-monitor/availability"]
+
+class BrokerMessage:
+    __slots__ = ("topic", "payload", "qos", "retain", "dup", "client_id", "time_us")
+
+    def __init__(self, topic : str, payload : bytes, qos : int, retain : bool, dup : bool, client_id : str) -> None :
+        self.topic = topic
+        self.payload = payload
+        self.qos = qos
+        self.retain = retain
+        self.dup = dup
+        self.client_id = client_id
+        self.time_us : int = clock.now_us()
+
+    def __repr__(self) -> str :
+        return "BrokerMessage(%s, %r, qos=%d, retain=%s)" % (self.topic, self.payload, self.qos, self.retain)
+
+def _topic_matches(pattern : str, topic : str) -> bool :
+    pattern_levels = pattern.split("/")
+    topic_levels = topic.split("/")
+    for i, level in enumerate(pattern_levels):
+        if level == "#":
+            return True
+        if i >= len(topic_levels) or (level != "+" and level != topic_levels[i]):
+            return False
+    return len(pattern_levels) == len(topic_levels)
+
+def _encode_length(n : int) -> bytes :
+    out = bytearray()
+    while True:
+        byte = n & 0x7F
+        n >>= 7
+        out.append(byte | 0x80 if n else byte)
+        if not n:
+            return bytes(out)
+
+class _BrokerSocket:
+    # Client end of a connection: write() feeds the broker, read() returns its replies
+    def __init__(self, broker) -> None :
+        self._broker = broker
+        self._inbound = bytearray()
+        self._outbound = bytearray()
+        self._blocking = True
+        self.connected = False
+        self.closed = False
+        self.client_id : str = None
+        self.subscriptions : list = []
+        self._will = None
+        self._inflight_in = set()  # QoS 2 packet ids awaiting PUBREL
+        self.on_data = None  # Called when a reply is queued or the connection closes
+
+    # --- socket API used by MQTT clients ---
+
+    def connect(self, address) :
+        if not self._broker.online:
+            raise OSError(errno.ECONNREFUSED, "connection refused")
+        self.connected = True
+        self._broker.sockets.append(self)
+
+    def setblocking(self, flag : bool) :
+        self._blocking = flag
+
+    def settimeout(self, timeout : float) :
+        self._blocking = timeout is None or timeout > 0
+
+    def setsockopt(self, *args) :
+        pass
+
+    def _check_open(self) :
+        if self.closed or not self.connected:
+            raise OSError(errno.ECONNRESET, "connection reset")
+
+    def write(self, data, length : int = -1) -> int :
+        self._check_open()
+        if isinstance(data, str):  # MicroPython sockets take str as UTF-8
+            data = data.encode()
+        data = bytes(data if length < 0 else memoryview(data)[:length])
+        self._broker.bytes_received += len(data)
+        self._broker.writes += 1
+        self._inbound += data
+        self._process()
+        return len(data)
+
+    send = write
+
+    def sendall(self, data) :
+        self.write(data)
+
+    def read(self, n : int = -1) -> bytes :
+        if not self._outbound:
+            if self.closed:
+                return b""
+            if not self._blocking:
+                return None
+            # A blocking read with nothing coming would hang the firmware forever
+            raise OSError(errno.ETIMEDOUT, "timed out")
+        if n < 0:
+            n = len(self._outbound)
+        data = bytes(self._outbound[:n])
+        del self._outbound[:n]
+        return data
+
+    def recv(self, n : int) -> bytes :
+        data = self.read(n)
+        if data is None:
+            raise OSError(errno.EAGAIN, "would block")
+        return data
+
+    def readinto(self, buf, n : int = -1) -> int :
+        if n < 0:
+            n = len(buf)
+        data = self.read(n)
+        if data is None:
+            return None
+        buf[:len(data)] = data
+        return len(data)
+
+    def close(self) :
+        if not self.closed:
+            self.closed = True
+            self._broker._disconnected(self)
+            if self.on_data is not None:
+                self.on_data()
+
+    # --- broker side ---
+
+    def _reply(self, data : bytes) :
+        self._outbound += data
+        self._broker.bytes_sent += len(data)
+        if self.on_data is not None:
+            self.on_data()
+
+    def _process(self) :
+        buf = self._inbound
+        while len(buf) >= 2:
+            length = 0
+            shift = 0
+            i = 1
+            while True:
+                if i >= len(buf):
+                    return
+                byte = buf[i]
+                length |= (byte & 0x7F) << shift
+                shift += 7
+                i += 1
+                if not byte & 0x80:
+                    break
+            if len(buf) < i + length:
+                return
+            header = buf[0]
+            body = bytes(buf[i:i + length])
+            del buf[:i + length]
+            self._handle(header, body)
+            if self.closed:
+                return
+
+    def _handle(self, header : int, body : bytes) :
+        kind = header >> 4
+        if kind == 1:
+            self._on_connect(body)
+        elif kind == 3:
+            self._on_publish(header, body)
+        elif kind == 4:
+            self._broker.pubacks_received += 1
+        elif kind == 6:  # PUBREL
+            pid = body[:2]
+            self._inflight_in.discard(pid)
+            self._reply(b"\x70\x02" + pid)
+        elif kind == 8:
+            self._on_subscribe(body)
+        elif kind == 10:  # UNSUBSCRIBE
+            self._reply(b"\xb0\x02" + body[:2])
+        elif kind == 12:
+            self._broker.pings += 1
+            self._reply(b"\xd0\x00")
+        elif kind == 14:
+            self._will = None
+            self.close()
+        else:
+            raise OSError(errno.EPROTO, "unexpected MQTT packet type %d" % kind)
+
+    def _on_connect(self, body : bytes) :
+        flags = body[7]
+        offset = 10
+        size = body[offset] << 8 | body[offset + 1]
+        self.client_id = body[offset + 2:offset + 2 + size].decode()
+        offset += 2 + size
+        self._will = None
+        if flags & 0x04:
+            size = body[offset] << 8 | body[offset + 1]
+            topic = body[offset + 2:offset + 2 + size].decode()
+            offset += 2 + size
+            size = body[offset] << 8 | body[offset + 1]
+            message = body[offset + 2:offset + 2 + size]
+            self._will = BrokerMessage(topic, message, (flags >> 3) & 3, bool(flags & 0x20), False, self.client_id)
+        self._broker.connects += 1
+        self._reply(b"\x20\x02\x00\x00")
+
+    def _on_publish(self, header : int, body : bytes) :
+        qos = (header >> 1) & 3
+        size = body[0] << 8 | body[1]
+        topic = body[2:2 + size].decode()
+        offset = 2 + size
+        pid = b""
+        if qos:
+            pid = body[offset:offset + 2]
+            offset += 2
+        broker = self._broker
+        if broker.drop_acks > 0 and qos:
+            broker.drop_acks -= 1
+        elif qos == 1:
+            self._reply(b"\x40\x02" + pid)
+        elif qos == 2:
+            if pid in self._inflight_in:
+                self._reply(b"\x50\x02" + pid)
+                return
+            self._inflight_in.add(pid)
+            self._reply(b"\x50\x02" + pid)
+        broker._publish(BrokerMessage(topic, body[offset:], qos, bool(header & 1), bool(header & 8), self.client_id))
+
+    def _on_subscribe(self, body : bytes) :
+        pid = body[:2]
+        offset = 2
+        granted = bytearray()
+        while offset < len(body):
+            size = body[offset] << 8 | body[offset + 1]
+            pattern = body[offset + 2:offset + 2 + size].decode()
+            qos = body[offset + 2 + size]
+            offset += 3 + size
+            self.subscriptions.append(pattern)
+            granted.append(min(qos, 1))
+        self._reply(b"\x90" + _encode_length(2 + len(granted)) + pid + bytes(granted))
+        for topic, message in self._broker.retained.items():
+            if any(_topic_matches(pattern, topic) for pattern in self.subscriptions):
+                self._deliver(message, True)
+
+    def _deliver(self, message : BrokerMessage, retain : bool) :
+        topic = message.topic.encode()
+        body = len(topic).to_bytes(2, "big") + topic + message.payload
+        self._reply(bytes((0x30 | retain,)) + _encode_length(len(body)) + body)
+
+class _BrokerStream:
+    # asyncio stream over a _BrokerSocket, reader and writer in one object like
+    # MicroPython's Stream. Reads wait for the broker instead of blocking.
+    def __init__(self, sock : _BrokerSocket) -> None :
+        self._sock = sock
+        self._ready = asyncio.Event()
+        sock.setblocking(False)
+        sock.on_data = self._ready.set
+
+    async def _wait(self) :
+        self._ready.clear()
+        await self._ready.wait()
+
+    async def read(self, n : int = -1) -> bytes :
+        # Whatever is available up to n bytes, b"" once the connection is closed
+        while True:
+            data = self._sock.read(n)
+            if data is not None:
+                return data
+            await self._wait()
+
+    async def readexactly(self, n : int) -> bytes :
+        data = b""
+        while len(data) < n:
+            chunk = await self.read(n - len(data))
+            if not chunk:
+                raise EOFError()
+            data += chunk
+        return data
+
+    async def readinto(self, buf) -> int :
+        while True:
+            n = self._sock.readinto(buf)
+            if n is not None:
+                return n
+            await self._wait()
+
+    def write(self, data) :
+        self._sock.write(data)
+
+    async def drain(self) :
+        pass
+
+    def close(self) :
+        self._sock.close()
+
+    async def wait_closed(self) :
+        pass
+
+    def get_extra_info(self, name : str, default = None) :
+        return ("127.0.0.1", 1883) if name == "peername" else default
+
+class _SocketModule:
+    # Stands in for the `socket` module of the patched client
+    AF_INET = 2
+    SOCK_STREAM = 1
+    IPPROTO_TCP = 6
+    SOL_SOCKET = 1
+    SO_REUSEADDR = 4
+
+    def __init__(self, broker) -> None :
+        self._broker = broker
+
+    def socket(self, *args) -> _BrokerSocket :
+        return _BrokerSocket(self._broker)
+
+    def getaddrinfo(self, host : str, port : int, *args) -> list :
+        return [(self.AF_INET, self.SOCK_STREAM, self.IPPROTO_TCP, "", (host, port))]
+
+class MqttBroker:
+    def __init__(self) -> None :
+        self.online : bool = True  # False refuses new connections
+        self.drop_acks : int = 0  # Number of upcoming QoS 1/2 publishes to leave unacknowledged
+        self.messages : list = []  # Every BrokerMessage received, in order
+        self.retained : dict = {}  # topic -> last retained BrokerMessage
+        self.sockets : list = []  # Open connections
+        self.socket = _SocketModule(self)
+        self.connects : int = 0
+        self.pings : int = 0
+        self.pubacks_received : int = 0
+        self.writes : int = 0
+        self.bytes_received : int = 0
+        self.bytes_sent : int = 0
+
+    def patch(self, module) :
+        # Points the module's `socket`, or asyncio's open_connection, at this broker
+        if module is asyncio:
+            module.open_connection = self.open_connection
+        else:
+            module.socket = self.socket
+
+    async def open_connection(self, host : str, port : int, **kwargs) :
+        sock = _BrokerSocket(self)
+        sock.connect((host, port))
+        stream = _BrokerStream(sock)
+        return stream, stream
+
+    def _publish(self, message : BrokerMessage) :
+        self.messages.append(message)
+        if message.retain:
+            if message.payload:
+                self.retained[message.topic] = message
+            else:
+                self.retained.pop(message.topic, None)
+        for sock in self.sockets:
+            if any(_topic_matches(pattern, message.topic) for pattern in sock.subscriptions):
+                sock._deliver(message, False)
+
+    def _disconnected(self, sock : _BrokerSocket) :
+        if sock in self.sockets:
+            self.sockets.remove(sock)
+        if sock._will is not None:
+            self._publish(sock._will)
+            sock._will = None
+
+    def drop_connections(self) :
+        # Network failure: every open connection is cut, last wills are published
+        for sock in list(self.sockets):
+            sock.close()
+
+    def messages_on(self, topic : str) -> list :
+        return [message for message in self.messages if message.topic == topic]
@@ -0,0 +1,94 @@
+import heapq
+import threading
+
+# MicroPython ticks_ms/ticks_us/ticks_cpu wrap at 2**30
+TICKS_PERIOD = 1 << 30
+TICKS_MAX = TICKS_PERIOD - 1
+_TICKS_HALFPERIOD = TICKS_PERIOD >> 1
+
+def ticks_add(ticks : int, delta : int) -> int :
+    return (ticks + delta) & TICKS_MAX
+
+def ticks_diff(ticks1 : int, ticks2 : int) -> int :
+    return ((ticks1 - ticks2 + _TICKS_HALFPERIOD) & TICKS_MAX) - _TICKS_HALFPERIOD
+
+class VirtualClock:
+    # Emulated time in microseconds since power on. Nothing moves it but
+    # advance(): sleeps, ADC conversions and the asyncio runner all advance it
+    # explicitly, so a run is deterministic and as fast as the host allows.
+    # Callbacks registered with call_at() (machine.Timer, WLAN association,
+    # scripted pin changes) fire in order while the clock passes their time.
+    # A lock serialises the changes, so a firmware thread (_thread) can sleep
+    # and read the ADC while the asyncio runner advances the same clock; the
+    # callbacks then fire on whichever thread moved the clock past them.
+    def __init__(self, epoch : int = 1767225600) -> None :
+        self._lock = threading.RLock()  # Reentrant, callbacks schedule more callbacks
+        self.reset(epoch)
+
+    def reset(self, epoch : int = 1767225600) :
+        with self._lock:
+            self._reset(epoch)
+
+    def _reset(self, epoch : int) :
+        self.epoch : int = epoch  # time.time() at power on, 2026-01-01 by default
+        self.tick_cost_us : int = 1  # Every ticks_* read costs this much, so busy waits terminate
+        self._now_us = 0
+        self._timers = []
+        self._sequence = 0
+
+    def now_us(self) -> int :
+        return self._now_us
+
+    def monotonic(self) -> float :
+        return self._now_us / 1000000
+
+    def time(self) -> int :
+        return self.epoch + self._now_us // 1000000
+
+    def ticks_ms(self) -> int :
+        return (self._now_us // 1000) & TICKS_MAX
+
+    def ticks_us(self) -> int :
+        return self._now_us & TICKS_MAX
+
+    def call_at(self, when_us : int, callback) -> list :
+        # Returns a handle for cancel()
+        with self._lock:
+            self._sequence += 1
+            timer = [max(when_us, self._now_us), self._sequence, callback]
+            heapq.heappush(self._timers, timer)
+            return timer
+
+    def call_later(self, delay_us : int, callback) -> list :
+        return self.call_at(self._now_us + delay_us, callback)
+
+    def cancel(self, timer : list) :
+        timer[2] = None
+
+    def next_timer_us(self) -> int :
+        # Time of the earliest pending callback, -1 if there is none
+        with self._lock:
+            timers = self._timers
+            while timers and timers[0][2] is None:
+                heapq.heappop(timers)
+            return timers[0][0] if timers else -1
+
+    def advance(self, delta_us : int) :
+        with self._lock:
+            self.advance_to(self._now_us + delta_us)
+
+    def advance_to(self, when_us : int) :
+        with self._lock:
+            timers = self._timers
+            while timers and timers[0][0] <= when_us:
+                due, _, callback = heapq.heappop(timers)
+                if callback is None:
+                    continue
+                if due > self._now_us:
+                    self._now_us = due
+                callback()
+            if when_us > self._now_us:
+                self._now_us = when_us
+
+# The board has one clock, shared by every emulated module
+clock = VirtualClock()
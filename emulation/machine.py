@@ -0,0 +1,169 @@
+# Emulated subset of the RP2040 machine module
+
+from emulation.board import board
+from emulation.clock import clock
+
+# Named pins of the Pico W; the LED hangs off the wireless chip, given a number past the GPIOs
+_PIN_NAMES = {"LED": 64, "WL_GPIO0": 64, "WL_GPIO1": 65, "WL_GPIO2": 66}
+
+def _gpio(pin) -> int :
+    if isinstance(pin, Pin):
+        return pin.gpio
+    if isinstance(pin, str):
+        if pin in _PIN_NAMES:
+            return _PIN_NAMES[pin]
+        if pin.startswith("GP"):
+            return int(pin[2:])
+        raise ValueError("unknown pin %s" % pin)
+    return int(pin)
+
+class Pin:
+    IN = 0
+    OUT = 1
+    OPEN_DRAIN = 2
+    ALT = 3
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_FALLING = 4
+    IRQ_RISING = 8
+
+    def __init__(self, id, mode : int = -1, pull : int = -1, *, value : int = None) -> None :
+        self.gpio : int = _gpio(id)
+        self.init(mode, pull, value=value)
+
+    def init(self, mode : int = -1, pull : int = -1, *, value : int = None) :
+        state = board.pin(self.gpio)
+        if mode != -1:
+            state.mode = mode
+        if pull != -1:
+            state.pull = pull
+        if value is not None:
+            board.write(self.gpio, value)
+
+    def value(self, x : int = None) -> int :
+        if x is None:
+            return board.level(self.gpio)
+        board.write(self.gpio, x)
+
+    __call__ = value
+
+    def on(self) :
+        board.write(self.gpio, 1)
+
+    def off(self) :
+        board.write(self.gpio, 0)
+
+    high = on
+    low = off
+
+    def toggle(self) :
+        board.write(self.gpio, not board.pin(self.gpio).output)
+
+    def irq(self, handler = None, trigger : int = IRQ_FALLING | IRQ_RISING, hard : bool = False) :
+        state = board.pin(self.gpio)
+        state.irq_handler = handler
+        state.irq_trigger = trigger
+        state.irq_pin = self
+
+    def __repr__(self) -> str :
+        return "Pin(GPIO%d)" % self.gpio
+
+class ADC:
+    CORE_TEMP = 4
+
+    def __init__(self, pin) -> None :
+        gpio = _gpio(pin)
+        # ADC(0..3) name channels, which sit on GPIO 26..29
+        self.gpio : int = gpio + 26 if gpio < 4 else gpio
+
+    def read_u16(self) -> int :
+        clock.advance(board.adc_conversion_us)
+        # 12-bit conversion scaled to 16 bits like the RP2040 port does
+        raw = board.adc_value(self.gpio) >> 4
+        return (raw << 4) | (raw >> 8)
+
+class PWM:
+    def __init__(self, pin, freq : int = 0, duty_u16 : int = -1) -> None :
+        self.gpio : int = _gpio(pin)
+        self._freq : int = 1000
+        if freq:
+            self._freq = freq
+        if duty_u16 >= 0:
+            self.duty_u16(duty_u16)
+
+    def freq(self, value : int = None) -> int :
+        if value is None:
+            return self._freq
+        self._freq = value
+
+    def duty_u16(self, value : int = None) -> int :
+        if value is None:
+            return max(board.pwm_duty(self.gpio), 0)
+        board.set_pwm_duty(self.gpio, min(max(int(value), 0), 65535))
+
+    def duty_ns(self, value : int = None) -> int :
+        period_ns = 1000000000 // self._freq
+        if value is None:
+            return self.duty_u16() * period_ns // 65535
+        self.duty_u16(value * 65535 // period_ns)
+
+    def deinit(self) :
+        board.set_pwm_duty(self.gpio, 0)
+
+class Timer:
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    def __init__(self, id : int = -1, **kwargs) -> None :
+        self._handle = None
+        if kwargs:
+            self.init(**kwargs)
+
+    def init(self, *, mode : int = PERIODIC, freq : float = -1, period : int = -1, callback = None) :
+        self.deinit()
+        period_us = int(1000000 / freq) if freq > 0 else max(period, 1) * 1000
+        self._callback = callback
+        self._mode = mode
+        self._period_us = period_us
+        self._handle = clock.call_later(period_us, self._fire)
+
+    def _fire(self) :
+        if self._mode == self.PERIODIC:
+            self._handle = clock.call_later(self._period_us, self._fire)
+        else:
+            self._handle = None
+        if self._callback is not None:
+            self._callback(self)
+
+    def deinit(self) :
+        if self._handle is not None:
+            clock.cancel(self._handle)
+            self._handle = None
+
+_freq = 125000000
+
+def freq(hz : int = None) -> int :
+    global _freq
+    if hz is None:
+        return _freq
+    _freq = hz
+
+def unique_id() -> bytes :
+    return b"\xe6\x61\x41\x04\x03\x2b\x5a\x2c"
+
+def idle() :
+    clock.advance(clock.tick_cost_us)
+
+def lightsleep(ms : int = 0) :
+    clock.advance(ms * 1000)
+
+deepsleep = lightsleep
+
+def disable_irq() -> int :
+    return 0
+
+def enable_irq(state : int = 0) :
+    pass
+
+def reset() :
+    raise SystemExit("machine.reset()")
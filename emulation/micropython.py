@@ -0,0 +1,30 @@
+# Emulated micropython module. The native/viper emitters are compiler
+# directives, not runtime attributes, so they are not emulated: code that
+# decorates with them stays on its pure Python path under the emulator.
+
+from emulation.clock import clock
+
+def const(value) :
+    return value
+
+def schedule(func, arg) :
+    # Runs soon after the current callback, like the firmware's scheduler
+    clock.call_later(0, lambda: func(arg))
+
+def alloc_emergency_exception_buf(size : int) :
+    pass
+
+def opt_level(level : int = None) -> int :
+    return 0
+
+def heap_lock() -> int :
+    return 0
+
+def heap_unlock() -> int :
+    return 0
+
+def kbd_intr(char : int) :
+    pass
+
+def mem_info(verbose : bool = False) :
+    pass
@@ -0,0 +1,94 @@
+# Emulated subset of the Pico W network module
+
+from emulation.board import board
+from emulation.clock import clock
+
+STA_IF = 0
+AP_IF = 1
+
+STAT_IDLE = 0
+STAT_CONNECTING = 1
+STAT_WRONG_PASSWORD = -3
+STAT_NO_AP_FOUND = -2
+STAT_CONNECT_FAIL = -1
+STAT_GOT_IP = 3
+
+_interfaces = {}
+
+def hostname(name : str = None) -> str :
+    global _hostname
+    if name is None:
+        return _hostname
+    _hostname = name
+
+_hostname = "PicoW"
+
+class WLAN:
+    # One instance per interface, like the firmware. Association completes
+    # board.wifi_connect_time seconds of emulated time after connect().
+    def __new__(cls, interface : int = STA_IF) :
+        wlan = _interfaces.get(interface)
+        if wlan is None:
+            wlan = _interfaces[interface] = super().__new__(cls)
+            wlan._active = False
+            wlan._status = STAT_IDLE
+            wlan._pending = None
+            wlan._config = {"ssid": "", "channel": 1, "txpower": 31}
+        return wlan
+
+    def __init__(self, interface : int = STA_IF) -> None :
+        pass
+
+    def active(self, is_active : bool = None) -> bool :
+        if is_active is None:
+            return self._active
+        self._active = bool(is_active)
+        if not self._active:
+            self.disconnect()
+
+    def connect(self, ssid : str, key : str = None) :
+        if not self._active:
+            raise OSError("WLAN not active")
+        self.disconnect()
+        self._config["ssid"] = ssid
+        self._status = STAT_CONNECTING
+        networks = board.networks
+        if networks and ssid not in networks:
+            result = STAT_NO_AP_FOUND
+        elif networks and networks[ssid] != key:
+            result = STAT_WRONG_PASSWORD
+        else:
+            result = STAT_GOT_IP
+        self._pending = clock.call_later(int(board.wifi_connect_time * 1000000), lambda: self._associated(result))
+
+    def _associated(self, result : int) :
+        self._pending = None
+        self._status = result
+
+    def disconnect(self) :
+        if self._pending is not None:
+            clock.cancel(self._pending)
+            self._pending = None
+        self._status = STAT_IDLE
+
+    def isconnected(self) -> bool :
+        return self._status == STAT_GOT_IP
+
+    def status(self, param : str = None) :
+        if param == "rssi":
+            return -55
+        return self._status
+
+    def ifconfig(self, config : tuple = None) -> tuple :
+        return (board.ip, "255.255.255.0", "192.168.1.1", "192.168.1.1")
+
+    def config(self, *args, **kwargs) :
+        if kwargs:
+            self._config.update(kwargs)
+            return
+        if args[0] == "mac":
+            return b"\x28\xcd\xc1\x00\x00\x01"
+        return self._config[args[0]]
+
+    def scan(self) -> list :
+        return [(ssid.encode(), b"\x00\x00\x00\x00\x00\x00", 1, -55, 3, 0) for ssid in board.networks]
@@ -0,0 +1,12 @@
+# Emulated subset of the rp2 module
+
+_country = "XX"
+
+def country(code : str = None) -> str :
+    global _country
+    if code is None:
+        return _country
+    _country = code
+
+def bootsel_button() -> int :
+    return 0
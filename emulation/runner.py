@@ -0,0 +1,83 @@
+import asyncio
+import selectors
+import _thread
+
+from emulation.clock import clock
+from emulation.utime import _host_time
+
+YIELD_S = 0.0002  # Host seconds handed to other threads per jump of the clock
+
+class _VirtualSelector(selectors.BaseSelector):
+    # Wraps the host selector. Real file descriptors are only polled, never
+    # waited on: where the event loop would block, the virtual clock jumps to
+    # the next asyncio timer or emulated hardware callback instead.
+    def __init__(self) -> None :
+        self._selector = selectors.DefaultSelector()
+
+    def register(self, fileobj, events, data = None) :
+        return self._selector.register(fileobj, events, data)
+
+    def unregister(self, fileobj) :
+        return self._selector.unregister(fileobj)
+
+    def modify(self, fileobj, events, data = None) :
+        return self._selector.modify(fileobj, events, data)
+
+    def get_key(self, fileobj) :
+        return self._selector.get_key(fileobj)
+
+    def get_map(self) :
+        return self._selector.get_map()
+
+    def close(self) :
+        self._selector.close()
+
+    def select(self, timeout : float = None) -> list :
+        clock.advance(0)  # Hardware callbacks that came due while tasks ran
+        ready = self._selector.select(0)
+        if ready or timeout == 0:
+            return ready
+        now = clock.now_us()
+        wake = clock.next_timer_us()
+        if timeout is not None:
+            # Round up, the loop only runs timers whose time has passed
+            deadline = now + max(1, int(timeout * 1000000 + 0.999999))
+            wake = deadline if wake < 0 else min(wake, deadline)
+        if wake < 0:
+            raise RuntimeError("Emulated firmware is blocked with nothing scheduled")
+        if _thread._count():
+            # Firmware threads (_thread) run on host time; let them catch up before time jumps
+            _host_time.sleep(YIELD_S)
+        clock.advance_to(wake)
+        return self._selector.select(0)
+
+class VirtualEventLoop(asyncio.SelectorEventLoop):
+    # asyncio event loop on emulated time: sleeps and timeouts cost no wall
+    # time, so firmware runs as fast as the host executes it
+    def __init__(self) -> None :
+        super().__init__(_VirtualSelector())
+
+    def time(self) -> float :
+        return clock.monotonic()
+
+def run(main, duration : float = None) :
+    # Runs the coroutine on a fresh VirtualEventLoop and returns its result.
+    # With duration (emulated seconds) a coroutine still running by then is
+    # cancelled and None is returned, so endless firmware loops can be timed.
+    loop = VirtualEventLoop()
+    asyncio.set_event_loop(loop)
+    try:
+        task = loop.create_task(main)
+        if duration is None:
+            return loop.run_until_complete(task)
+        loop.run_until_complete(asyncio.wait((task,), timeout=duration))
+        if task.done():
+            return task.result()
+        return None
+    finally:
+        pending = asyncio.all_tasks(loop)
+        for task in pending:
+            task.cancel()
+        loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+        loop.close()
+        asyncio.set_event_loop(None)
@@ -0,0 +1,57 @@
+# Emulated MicroPython time module, installed as both `time` and `utime`.
+# Anything not emulated here falls through to the host time module.
+
+import _thread
+import calendar
+import time as _host_time
+
+from emulation.clock import clock, ticks_add, ticks_diff
+
+def ticks_ms() -> int :
+    clock.advance(clock.tick_cost_us)
+    return clock.ticks_ms()
+
+def ticks_us() -> int :
+    clock.advance(clock.tick_cost_us)
+    return clock.ticks_us()
+
+# RP2040 ticks_cpu counts microseconds as well
+ticks_cpu = ticks_us
+
+_main_thread = _thread.get_ident()  # Runs the emulated asyncio loop
+
+def sleep_us(us : int) :
+    if _thread.get_ident() == _main_thread:
+        clock.advance(us)
+        return
+    # A _thread worker (the second core) waits for the runner to bring the clock
+    # there; moving it alone would make time race ahead of the first core
+    woken = _thread.allocate_lock()
+    woken.acquire()
+    clock.call_later(us, woken.release)
+    woken.acquire()
+
+def sleep(seconds : float) :
+    sleep_us(int(seconds * 1000000))
+
+def sleep_ms(ms : int) :
+    sleep_us(ms * 1000)
+
+def time() -> int :
+    return clock.time()
+
+def time_ns() -> int :
+    return clock.epoch * 1000000000 + clock.now_us() * 1000
+
+def localtime(secs : int = None) -> tuple :
+    # MicroPython order: year, month, mday, hour, minute, second, weekday, yearday
+    return tuple(_host_time.gmtime(clock.time() if secs is None else secs))[:8]
+
+gmtime = localtime
+
+def mktime(local : tuple) -> int :
+    # The emulated board keeps UTC, like an RP2040 without a timezone set
+    return calendar.timegm(tuple(local[:6]))
+
+def __getattr__(name : str) :
+    return getattr(_host_time, name)
@@ -0,0 +1,127 @@
+import math
+import random
+
+# Scriptable ADC inputs. A waveform maps emulated time (microseconds since
+# power on) to a raw 16-bit level; waveforms add up with `+`, so a slowly
+# drying soil with sensor noise and the odd glitch is
+#   Decay(20000, 52000, 86400) + Noise(300) + Spikes(0.01, 20000)
+# The ADC clamps and quantises the sum like the RP2040's 12-bit converter.
+
+class Waveform:
+    def __call__(self, t_us : int) -> float :
+        raise NotImplementedError
+
+    def __add__(self, other) :
+        return Sum(self, other if isinstance(other, Waveform) else Constant(other))
+
+    __radd__ = __add__
+
+class Sum(Waveform):
+    def __init__(self, *parts) -> None :
+        self._parts = parts
+
+    def __call__(self, t_us : int) -> float :
+        total = 0
+        for part in self._parts:
+            total += part(t_us)
+        return total
+
+class Constant(Waveform):
+    def __init__(self, level : float) -> None :
+        self.level = level
+
+    def __call__(self, t_us : int) -> float :
+        return self.level
+
+class Ramp(Waveform):
+    # Linear from start to end over duration seconds, then holds end
+    def __init__(self, start : float, end : float, duration : float, delay : float = 0) -> None :
+        self._start = start
+        self._end = end
+        self._t0 = int(delay * 1000000)
+        self._length = max(1, int(duration * 1000000))
+
+    def __call__(self, t_us : int) -> float :
+        progress = min(max(t_us - self._t0, 0), self._length) / self._length
+        return self._start + (self._end - self._start) * progress
+
+class Decay(Waveform):
+    # Exponential approach from start to end with time constant tau seconds,
+    # the shape of soil drying out after watering
+    def __init__(self, start : float, end : float, tau : float, delay : float = 0) -> None :
+        self._start = start
+        self._end = end
+        self._t0 = int(delay * 1000000)
+        self._tau_us = tau * 1000000
+
+    def __call__(self, t_us : int) -> float :
+        elapsed = max(t_us - self._t0, 0)
+        return self._end + (self._start - self._end) * math.exp(-elapsed / self._tau_us)
+
+class Sine(Waveform):
+    def __init__(self, mean : float, amplitude : float, period : float, phase : float = 0) -> None :
+        self._mean = mean
+        self._amplitude = amplitude
+        self._omega = 2 * math.pi / (period * 1000000)
+        self._phase = phase
+
+    def __call__(self, t_us : int) -> float :
+        return self._mean + self._amplitude * math.sin(self._omega * t_us + self._phase)
+
+class Steps(Waveform):
+    # Piecewise constant: [(at_seconds, level), ...], level before the first step is `initial`
+    def __init__(self, steps : list, initial : float = 0) -> None :
+        self._steps = sorted((int(at * 1000000), level) for at, level in steps)
+        self._initial = initial
+
+    def set(self, at : float, level : float) :
+        self._steps.append((int(at * 1000000), level))
+        self._steps.sort()
+
+    def __call__(self, t_us : int) -> float :
+        level = self._initial
+        for at, step_level in self._steps:
+            if at > t_us:
+                break
+            level = step_level
+        return level
+
+class Noise(Waveform):
+    # Zero-mean Gaussian noise, seeded so runs repeat
+    def __init__(self, sigma : float, seed : int = 0) -> None :
+        self._sigma = sigma
+        self._random = random.Random(seed)
+
+    def __call__(self, t_us : int) -> float :
+        return self._random.gauss(0, self._sigma)
+
+class Spikes(Waveform):
+    # Impulsive glitches: with the given probability a conversion is off by +-amplitude
+    def __init__(self, probability : float, amplitude : float, seed : int = 1) -> None :
+        self._probability = probability
+        self._amplitude = amplitude
+        self._random = random.Random(seed)
+
+    def __call__(self, t_us : int) -> float :
+        if self._random.random() >= self._probability:
+            return 0
+        return self._amplitude if self._random.random() < 0.5 else -self._amplitude
+
+class Trace(Waveform):
+    # Plays back recorded levels. With rate_hz each level holds for one sample
+    # period of emulated time; without it every conversion takes the next level.
+    # The trace repeats when it runs out.
+    def __init__(self, levels, rate_hz : float = 0) -> None :
+        if len(levels) == 0:
+            raise ValueError("empty trace")
+        self._levels = levels
+        self._period_us = 1000000 / rate_hz if rate_hz > 0 else 0
+        self._index = 0
+
+    def __call__(self, t_us : int) -> float :
+        levels = self._levels
+        if self._period_us:
+            return levels[int(t_us / self._period_us) % len(levels)]
+        level = levels[self._index]
+        self._index = (self._index + 1) % len(levels)
+        return level
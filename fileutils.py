@@ -11,29 +11,116 @@ class JsonFileUtil:
         try:
             with open(self.path, "r") as f:
                 data = ujson.load(f)
-            log.debug(f"Loaded JSON from {self.path}: {data}")
+            log.debug("Loaded JSON from %s: %s", self.path, data)
             return data
         except OSError:
-            log.debug(f"No file found: {self.path}")
+            log.debug("No file found: %s", self.path)
             return default
         except ValueError as e:
-            log.debug(f"Invalid JSON in {self.path}: {e}")
+            log.debug("Invalid JSON in %s: %s", self.path, e)
             return default
 
     def rewrite(self, obj):
         try:
             with open(self.path, "w") as f:
                 ujson.dump(obj, f)
-            log.debug(f"Wrote JSON to {self.path}: {obj}")
+            log.debug("Wrote JSON to %s: %s", self.path, obj)
         except OSError as e:
-            log.debug(f"Error writing {self.path}: {e}")
+            log.debug("Error writing %s: %s", self.path, e)
             raise
 
     def delete(self) -> bool:
         try:
             os.remove(self.path)
-            log.debug(f"Deleted file: {self.path}")
+            log.debug("Deleted file: %s", self.path)
             return True
         except OSError:
-            log.debug(f"No file to delete: {self.path}")
+            log.debug("No file to delete: %s", self.path)
+            return False
+
+class BinaryFileUtil:
+    def __init__(self, path: str):
+        self.path = path
+
+    def read_into(self, buf, nbytes: int) -> bool:
+        # Fills a preallocated buffer of nbytes; False if the file is missing or the size differs
+        try:
+            with open(self.path, "rb") as f:
+                n = f.readinto(buf)
+                if n == nbytes and f.read(1):
+                    n += 1
+            if n != nbytes:
+                log.debug("Unexpected size of %s: %d bytes", self.path, n)
+                return False
+            log.debug("Loaded %d bytes from %s", n, self.path)
+            return True
+        except OSError:
+            log.debug("No file found: %s", self.path)
+            return False
+
+    def rewrite(self, buf):
+        try:
+            with open(self.path, "wb") as f:
+                n = f.write(buf)
+            log.debug("Wrote %d bytes to %s", n, self.path)
+        except OSError as e:
+            log.debug("Error writing %s: %s", self.path, e)
+            raise
+
+    def append(self, *bufs) -> int:
+        # Writes the buffers one after another at the end of the file, creating it if needed
+        try:
+            n = 0
+            with open(self.path, "ab") as f:
+                for buf in bufs:
+                    n += f.write(buf)
+            return n
+        except OSError as e:
+            log.debug("Error appending to %s: %s", self.path, e)
+            raise
+
+    def read_at(self, offset: int, buf) -> int:
+        # Fills buf from offset on; the byte count read, 0 if the file is missing
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(offset)
+                return f.readinto(buf) or 0
+        except OSError:
+            log.debug("No file found: %s", self.path)
+            return 0
+
+    def truncate(self, size: int, buf) -> None:
+        # Keeps the first size bytes. Files have no truncate() on MicroPython, so the
+        # kept part is copied through buf into a new file that replaces this one.
+        tmp_path = self.path + ".tmp"
+        mv = memoryview(buf)
+        try:
+            with open(self.path, "rb") as src, open(tmp_path, "wb") as dst:
+                left = size
+                while left > 0:
+                    n = src.readinto(mv[:min(left, len(mv))])
+                    if not n:
+                        break
+                    dst.write(mv[:n])
+                    left -= n
+            os.rename(tmp_path, self.path)
+            log.debug("Truncated %s to %d bytes", self.path, size)
+        except OSError as e:
+            log.debug("Error truncating %s: %s", self.path, e)
+            raise
+
+    def size(self) -> int:
+        # -1 if the file does not exist
+        try:
+            return os.stat(self.path)[6]
+        except OSError:
+            return -1
+
+    def delete(self) -> bool:
+        try:
+            os.remove(self.path)
+            log.debug("Deleted file: %s", self.path)
+            return True
+        except OSError:
+            log.debug("No file to delete: %s", self.path)
             return False
@@ -1,20 +1,27 @@
 import network, json
-from umqtt.simple import MQTTClient
+from umqtt.simple_async import MQTTClient
 import asyncio
+import hashlib
+import random
 import time
 import rp2
 
 from logger import log
+from fileutils import BinaryFileUtil
 
 rp2.country("GB")
 
+SW_VERSION = "1.0"
+DISCOVERY_DIGEST_PATH = "ha-discovery.sha256"
+HA_STATUS_TOPIC = b"homeassistant/status"
+
 class HomeAssistantClient:
     async def _connect_wifi(self, name: str, password: str, attempts: int = 10, timeout: int = 5):
         wlan = network.WLAN(network.STA_IF)
         wlan.active(True)
 
         while not wlan.isconnected():
-            log.debug(f"Connecting to WiFi {name}, attempts left: {attempts}")
+            log.debug("Connecting to WiFi %s, attempts left: %d", name, attempts)
             if attempts <= 0:
                 raise Exception(f"Failed to connect to WiFi {name}. Exceeded maximum attempts.")
 
@@ -33,27 +40,60 @@ class HomeAssistantClient:
 
             attempts -= 1
 
-        log.debug(f"Connected to WiFi {name}, IP: {wlan.ifconfig()[0]}")
+        log.debug(lambda: f"Connected to WiFi {name}, IP: {wlan.ifconfig()[0]}")
     
-    def _connect_mqtt(self, host : str, client_id : str):
-        log.debug(f"Connecting to MQTT broker at {host} with client ID {client_id}")
+    async def _connect_mqtt(self, host : str, client_id : str):
+        log.debug("Connecting to MQTT broker at %s with client ID %s", host, client_id)
 
         self._client = MQTTClient(
             client_id=client_id,
             server=host,
-            keepalive=5,
-            port=1883)
+            keepalive=self._keepalive,
+            port=1883,
+            window=8)
 
-        availability_topic = f"{client_id}/availability"
-        self._client.set_last_will(availability_topic, b"offline", retain=True, qos=1)
-        self._client.connect()
-        self._client.publish(availability_topic, b"online", retain=True, qos=1)
-    
-    def _register_components(self, client_id : str):
-        log.debug(f"Registering components for client ID {client_id}")
+        self._client.set_last_will(self._availability_topic, b"offline", retain=True, qos=1)
+        self._client.set_callback(self._on_message)
+        await self._client.connect()
+        await self._client.publish(self._availability_topic, b"online", retain=True, qos=1)
+        await self._client.subscribe(HA_STATUS_TOPIC)
+
+    def _on_message(self, topic, msg):
+        # Home Assistant goes "offline" and back "online" when it restarts, and may have lost the retained
+        # config by then. Only that change counts, a status replayed on (re)subscribing does not.
+        if bytes(topic) != HA_STATUS_TOPIC:
+            return
+        online = bytes(msg) == b"online"
+        if online and not self._ha_online:
+            self._discovery_requested = True
+            if self.ready.is_set():
+                asyncio.create_task(self._republish_components())
+        self._ha_online = online
 
-        soil_moisture_sensor = "HD_38_soil_moisture_sensor"
-        self._soil_moisture_sensor_state_topic =  f"{client_id}/{soil_moisture_sensor}/state"
+    async def _republish_components(self):
+        try:
+            await self._register_components(self._device_id)
+        except Exception as e:
+            self._connection_lost(e)
+    
+    def _build_components(self, client_id : str):
+        # Topics and the discovery config are encoded once; the config only changes with the firmware
+        # The first probe keeps the original component name so existing installs stay bound to it
+        components = {}
+        self._soil_moisture_sensor_state_topics = []
+        self._soil_moisture_sensor_journal_topics = []
+        for probe in range(self._probe_count):
+            soil_moisture_sensor = "HD_38_soil_moisture_sensor" if probe == 0 else f"HD_38_soil_moisture_sensor_{probe + 1}"
+            state_topic = f"{client_id}/{soil_moisture_sensor}/state"
+            self._soil_moisture_sensor_state_topics.append(state_topic.encode())
+            self._soil_moisture_sensor_journal_topics.append(f"{client_id}/{soil_moisture_sensor}/journal".encode())
+            components[soil_moisture_sensor] = {
+                "unique_id": soil_moisture_sensor,
+                "platform": "sensor",
+                "device_class": "moisture",
+                "unit_of_measurement":"%",
+                "state_topic": state_topic,
+            }
       
         config = {
             "device" : {
@@ -64,48 +104,184 @@ class HomeAssistantClient:
             },
             "origin" : {
                 "name": "SQM OS",
-                "sw_version": "1.0"
-            },
-            "components": {
-                soil_moisture_sensor: {
-                    "unique_id": soil_moisture_sensor,
-                    "platform": "sensor",
-                    "device_class": "moisture",
-                    "unit_of_measurement":"%",
-                    "state_topic": self._soil_moisture_sensor_state_topic,
-                }
+                "sw_version": SW_VERSION
             },
-        }    
-        self._client.publish(f"homeassistant/device/{client_id}/config", json.dumps(config), retain=True, qos=1)
+            "components": components,
+        }
+        self._availability_topic = f"{client_id}/availability".encode()
+        self._discovery_topic = f"homeassistant/device/{client_id}/config".encode()
+        self._discovery = json.dumps(config).encode()
+        self._discovery_digest = hashlib.sha256(self._discovery).digest()
+        self._discovery_published = False
+        self._discovery_requested = False  # Home Assistant came back online, publish even if unchanged
+        self._ha_online = True  # Last status of Home Assistant, assumed up at boot
+
+    async def _register_components(self, client_id : str):
+        # The config is retained, so the broker keeps it across reconnects. It is republished when its digest
+        # differs from the one stored on flash after the last publish, i.e. when components or firmware changed,
+        # and when Home Assistant comes back online, in case the broker lost it meanwhile.
+        if not self._discovery_requested:
+            if self._discovery_published:
+                return
+            stored = bytearray(len(self._discovery_digest))
+            if self._discovery_digest_file.read_into(stored, len(stored)) and stored == self._discovery_digest:
+                log.debug("Discovery config for client ID %s unchanged, not republished", client_id)
+                self._discovery_published = True
+                return
+
+        log.debug("Registering components for client ID %s", client_id)
+        await self._client.publish(self._discovery_topic, self._discovery, retain=True, qos=1)
+        await self._client.flush()
+        self._discovery_digest_file.rewrite(self._discovery_digest)
+        self._discovery_published = True
+        self._discovery_requested = False
     
-    def __init__(self, wifi_ssid : str, wifi_psk : str, mqtt_host : str):
+    def __init__(self, wifi_ssid : str, wifi_psk : str, mqtt_host : str, probe_count : int = 1, keepalive : int = 30,
+                 ready_timeout : float = 10, min_backoff : float = 1, max_backoff : float = 300):
         self._wifi_ssid = wifi_ssid
         self._wifi_psk = wifi_psk
         self._mqtt_host = mqtt_host
+        self._probe_count = probe_count
+        self._device_id = "soil-quality-monitor"
+        self._keepalive = keepalive  # Seconds, pinged at half of it
+        self._ready_timeout = ready_timeout  # Longest a publish waits for the connection
+        self._min_backoff = min_backoff
+        self._max_backoff = max_backoff
+        self._discovery_digest_file = BinaryFileUtil(DISCOVERY_DIGEST_PATH)
+        self._build_components(self._device_id)
+
+        # Set while the MQTT session is up, publishers wait on it instead of reconnecting themselves
+        self.ready = asyncio.Event()
+        self._lost = asyncio.Event()
+        self._supervisor = None
+        self._reconnect_func = None
+        self._reconnect_args = ()
 
     async def connect(self):
         log.debug("Connecting to Home Assistant")
 
-        device_id = "soil-quality-monitor"
         await self._connect_wifi(name=self._wifi_ssid, password=self._wifi_psk)
-        self._connect_mqtt(host=self._mqtt_host, client_id=device_id)
-        self._register_components(device_id)
+        await self._connect_mqtt(host=self._mqtt_host, client_id=self._device_id)
+        await self._register_components(self._device_id)
+        await self._client.flush()
+        self.ready.set()
+        if self._supervisor is None:
+            self._supervisor = asyncio.create_task(self._supervise())
+
+    async def _reconnect(self):
+        await self._connect_wifi(name=self._wifi_ssid, password=self._wifi_psk, attempts=1)
+        self._lost.clear()
+        # The session is resumed, so QoS 1 messages still awaiting their ack are sent again
+        await self._client.connect(False)
+        await self._client.publish(self._availability_topic, b"online", retain=True, qos=1)
+        await self._client.subscribe(HA_STATUS_TOPIC)
+        await self._register_components(self._device_id)
+        await self._client.flush()
+        log.info("Reconnected to the MQTT broker")
+        self.ready.set()
+        if self._reconnect_func is not None:
+            self._reconnect_func(*self._reconnect_args)
+
+    def subscribe_reconnect(self, func, args=()):
+        # func(*args) runs every time the supervisor has restored the session
+        self._reconnect_func = func
+        self._reconnect_args = args
 
-    def publish_soil_moisture(self, moisture_level: int, attempts: int = 10):
-        log.debug(f"Publishing soil moisture level: {moisture_level}")
+    def _connection_lost(self, e : Exception):
+        if self.ready.is_set():
+            log.warning("Connection to the MQTT broker lost: %s", e)
+            self.ready.clear()
+            self._lost.set()
+
+    async def _supervise(self):
+        # Pings while the session is up and reconnects, with exponential backoff and jitter, once it is lost
+        failures = 0
+        while True:
+            if self.ready.is_set():
+                try:
+                    await asyncio.wait_for(self._lost.wait(), self._keepalive / 2)
+                    continue
+                except asyncio.TimeoutError:
+                    pass
+                try:
+                    await self._client.ping(wait=True)
+                except Exception as e:
+                    self._connection_lost(e)
+                continue
+
+            try:
+                await self._reconnect()
+                failures = 0
+            except Exception as e:
+                # Jitter keeps a fleet that lost the broker together from reconnecting in lockstep
+                delay = min(self._max_backoff, self._min_backoff * 2 ** min(failures, 16))
+                delay *= 0.5 + random.random() / 2
+                failures += 1
+                log.warning("Reconnecting failed: %s, next attempt in %.1f s", e, delay)
+                await asyncio.sleep(delay)
+
+    def _check_probe(self, probe : int):
+        # A bad index is the caller's mistake, it must not pass for a lost connection in the retry loop
+        if probe < 0 or probe >= self._probe_count:
+            raise ValueError(f"Probe index must be between 0 and {self._probe_count - 1}.")
+
+    def _discard(self, pids : list):
+        for pid in pids:
+            self._client.discard(pid)
+
+    async def _wait_ready(self):
+        try:
+            await asyncio.wait_for(self.ready.wait(), self._ready_timeout)
+        except asyncio.TimeoutError:
+            raise Exception("Not connected to the MQTT broker")
+
+    async def _publish_states(self, readings : list, attempts : int):
+        # readings are (probe, moisture level) pairs; they go out back to back and are confirmed together
+        for probe, moisture_level in readings:
+            log.debug("Publishing soil moisture level: %d", moisture_level)
+            if moisture_level < 0 or moisture_level > 100:
+                raise ValueError("Moisture level must be between 0 and 100.")
+            self._check_probe(probe)
 
-        if moisture_level < 0 or moisture_level > 100:
-            raise ValueError("Moisture level must be between 0 and 100.")
-        
         while True:
             if attempts <= 0:
                 raise Exception("Failed to publish soil moisture after multiple attempts.")
+            await self._wait_ready()
+            pids = []
             try:
-                self._client.publish(self._soil_moisture_sensor_state_topic, ("%.1f" % moisture_level), retain=True, qos=1)
+                for probe, moisture_level in readings:
+                    pids.append(await self._client.publish(self._soil_moisture_sensor_state_topics[probe], (b"%d.0" % moisture_level), retain=True, qos=1))
+                await self._client.flush()
                 log.debug("Soil moisture published successfully")
                 return
             except Exception as e:
+                # The next attempt or the caller's journal sends them again, the resumed session must not
+                self._discard(pids)
                 attempts -= 1
-                log.debug(f"Failed to publish soil moisture: {e}, reconnecting attempts left: {attempts}")
-                self._client.connect(False)
-                
\ No newline at end of file
+                log.debug("Failed to publish soil moisture: %s, attempts left: %d", e, attempts)
+                self._connection_lost(e)
+
+    async def publish_soil_moisture(self, moisture_level: int, attempts: int = 10, probe: int = 0):
+        await self._publish_states([(probe, moisture_level)], attempts)
+
+    async def publish_soil_moisture_array(self, moisture_levels: list, attempts: int = 10):
+        # One reading per probe, as returned by SensorArray.measure_soil_moisture
+        await self._publish_states(list(enumerate(moisture_levels)), attempts)
+
+    async def publish_soil_moisture_history(self, readings : list):
+        # Journaled (timestamp, probe, moisture level) readings, oldest first, each with the time it was taken.
+        # They go to the journal topic, so the retained state keeps the latest reading. One attempt, the caller retries.
+        for timestamp, probe, moisture_level in readings:
+            self._check_probe(probe)
+        await self._wait_ready()
+        pids = []
+        try:
+            for timestamp, probe, moisture_level in readings:
+                pids.append(await self._client.publish(self._soil_moisture_sensor_journal_topics[probe],
+                                                       b'{"timestamp": %d, "moisture": %d}' % (timestamp, moisture_level), qos=1))
+            await self._client.flush()
+        except Exception as e:
+            self._discard(pids)
+            self._connection_lost(e)
+            raise
+        log.debug("Published %d journaled soil moisture readings", len(readings))
@@ -0,0 +1,111 @@
+# Reduction kernels over u16 sample buffers: array('H') or a memoryview of one.
+# On MicroPython the hot loops are compiled with the viper/native emitters;
+# on CPython the pure Python versions below are used, leaning on C builtins.
+# The pure Python versions stay importable as py_* for reference and benchmarks.
+
+import array
+import sys
+
+# The emitters are MicroPython compiler features, an importable micropython
+# module alone (such as the host emulation's) does not provide them
+NATIVE = sys.implementation.name == "micropython"
+if NATIVE:
+    import micropython
+
+# Viper works on 32-bit machine ints, so sums are taken in chunks that cannot overflow
+_CHUNK = 32768
+
+def py_sum_u16(data) -> int :
+    return sum(data)
+
+def py_minmax_u16(data) -> tuple :
+    if len(data) == 0:
+        raise ValueError("empty array")
+    return min(data), max(data)
+
+def py_sumsq_u16(data) -> int :
+    total = 0
+    for value in data:
+        total += value * value
+    return total
+
+def py_histogram_u16(data, counts, shift : int = 4) :
+    # counts[v >> shift] += 1 for every sample; counts is not cleared first
+    for value in data:
+        counts[value >> shift] += 1
+
+if NATIVE:
+    @micropython.viper
+    def _viper_sum_u16(buf: ptr16, start: int, end: int) -> int:
+        total = 0
+        i = start
+        while i < end:
+            total += buf[i]
+            i += 1
+        return total
+
+    @micropython.viper
+    def _viper_minmax_u16(buf: ptr16, n: int, out: ptr16):
+        lo = buf[0]
+        hi = lo
+        i = 1
+        while i < n:
+            value = buf[i]
+            if value < lo:
+                lo = value
+            elif value > hi:
+                hi = value
+            i += 1
+        out[0] = lo
+        out[1] = hi
+
+    @micropython.viper
+    def _viper_histogram_u16(buf: ptr16, n: int, counts: ptr16, shift: int):
+        i = 0
+        while i < n:
+            slot = buf[i] >> shift
+            counts[slot] += 1
+            i += 1
+
+    def sum_u16(data) -> int :
+        n = len(data)
+        total = 0
+        start = 0
+        while start < n:
+            end = min(start + _CHUNK, n)
+            total += _viper_sum_u16(data, start, end)
+            start = end
+        return total
+
+    _minmax_out = array.array('H', (0, 0))
+
+    def minmax_u16(data) -> tuple :
+        n = len(data)
+        if n == 0:
+            raise ValueError("empty array")
+        _viper_minmax_u16(data, n, _minmax_out)
+        return _minmax_out[0], _minmax_out[1]
+
+    # A square needs the full 32 bits and the total needs more, so this one
+    # stays on the native emitter with Python ints
+    @micropython.native
+    def sumsq_u16(data) -> int :
+        total = 0
+        for value in data:
+            total += value * value
+        return total
+
+    def histogram_u16(data, counts, shift : int = 4) :
+        if len(counts) < (65536 >> shift):
+            raise ValueError("counts too small for shift")
+        _viper_histogram_u16(data, len(data), counts, shift)
+
+else:
+    sum_u16 = py_sum_u16
+    minmax_u16 = py_minmax_u16
+    sumsq_u16 = py_sumsq_u16
+
+    def histogram_u16(data, counts, shift : int = 4) :
+        if len(counts) < (65536 >> shift):
+            raise ValueError("counts too small for shift")
+        py_histogram_u16(data, counts, shift)
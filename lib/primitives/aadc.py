@@ -5,6 +5,7 @@
 
 import asyncio
 import io
+from time import ticks_us, ticks_add, ticks_diff
 
 MP_STREAM_POLL_RD = const(1)
 MP_STREAM_POLL = const(3)
@@ -52,6 +53,41 @@ class AADC(io.IOBase):
             return self._last
         return self._adcread()
 
+    # Mean of oversample back-to-back conversions
+    def read_oversampled(self, oversample=1):
+        adc = self._adc
+        acc = 0
+        for _ in range(oversample):
+            acc += adc.read_u16()
+        self._last = acc // oversample
+        return self._last
+
+    # Fill buf (array or memoryview) with a tight burst of readings and return
+    # the count. Each entry is the mean of oversample conversions (decimation).
+    # With period_us > 0 entries start period_us apart, paced against ticks_us
+    # so loop overhead does not accumulate. Blocks for about len(buf) * period_us.
+    # If stop is given it is called with each entry and ends the burst early
+    # by returning True.
+    def read_burst(self, buf, oversample=1, period_us=0, stop=None):
+        adc = self._adc
+        n = len(buf)
+        deadline = ticks_us()
+        for i in range(n):
+            acc = 0
+            for _ in range(oversample):
+                acc += adc.read_u16()
+            buf[i] = acc // oversample
+            if stop is not None and stop(buf[i]):
+                n = i + 1
+                break
+            if period_us:
+                deadline = ticks_add(deadline, period_us)
+                while ticks_diff(deadline, ticks_us()) > 0:
+                    pass
+        if n:
+            self._last = buf[n - 1]
+        return n
+
     # Call syntax: set limits for trigger
     # lower is None: leave limits unchanged.
     # upper is None: treat lower as relative to current value.
@@ -0,0 +1,186 @@
+import struct
+
+# MQTT 3.1.1 packet encoder shared by umqtt.simple and umqtt.simple_async.
+# Each packet is assembled in one reusable buffer, so it goes out in a single
+# write and building it allocates nothing. Topics and payloads are copied
+# as given; pass bytes, a str is encoded on every call. The methods return
+# the packet length, the packet is buf[:length] (or mv[:length]) until the
+# next one is built. The buffer grows to fit a larger packet and keeps that
+# size.
+
+
+class PacketBuilder:
+    def __init__(self, size=256):
+        self.buf = bytearray(size)
+        self.mv = memoryview(self.buf)
+
+    def _start(self, header, sz):
+        # Writes the fixed header, returns the offset of the variable header
+        assert sz < 2097152
+        n = 2
+        rest = sz >> 7
+        while rest:
+            n += 1
+            rest >>= 7
+        if n + sz > len(self.buf):
+            self.buf = bytearray(n + sz)
+            self.mv = memoryview(self.buf)
+        buf = self.buf
+        buf[0] = header
+        i = 1
+        while sz > 0x7F:
+            buf[i] = (sz & 0x7F) | 0x80
+            sz >>= 7
+            i += 1
+        buf[i] = sz
+        return i + 1
+
+    def _put(self, i, data):
+        end = i + len(data)
+        self.mv[i:end] = data  # Unlike bytearray slice assignment, no temporary copy on CPython
+        return end
+
+    def _put_str(self, i, s):
+        struct.pack_into("!H", self.buf, i, len(s))
+        return self._put(i + 2, s)
+
+    def connect(self, client_id, clean_session=True, keepalive=0, user=None, password=None,
+                lw_topic=None, lw_msg=None, lw_qos=0, lw_retain=False):
+        client_id = _bytes(client_id)
+        sz = 10 + 2 + len(client_id)
+        flags = clean_session << 1
+        if user:
+            user = _bytes(user)
+            password = _bytes(password)
+            sz += 2 + len(user) + 2 + len(password)
+            flags |= 0xC0
+        if lw_topic:
+            lw_topic = _bytes(lw_topic)
+            lw_msg = _bytes(lw_msg)
+            sz += 2 + len(lw_topic) + 2 + len(lw_msg)
+            flags |= 0x4 | (lw_qos & 0x1) << 3 | (lw_qos & 0x2) << 3
+            flags |= lw_retain << 5
+        assert keepalive < 65536
+        i = self._put(self._start(0x10, sz), b"\x00\x04MQTT\x04")
+        struct.pack_into("!BH", self.buf, i, flags, keepalive)
+        i = self._put_str(i + 3, client_id)
+        if lw_topic:
+            i = self._put_str(i, lw_topic)
+            i = self._put_str(i, lw_msg)
+        if user:
+            i = self._put_str(i, user)
+            i = self._put_str(i, password)
+        return i
+
+    def publish(self, topic, msg, retain=False, qos=0, pid=0, dup=False):
+        topic = _bytes(topic)
+        msg = _bytes(msg)
+        sz = 2 + len(topic) + len(msg)
+        if qos > 0:
+            sz += 2
+        i = self._put_str(self._start(0x30 | dup << 3 | qos << 1 | retain, sz), topic)
+        if qos > 0:
+            struct.pack_into("!H", self.buf, i, pid)
+            i += 2
+        return self._put(i, msg)
+
+    def subscribe(self, topic, qos, pid):
+        topic = _bytes(topic)
+        i = self._start(0x82, 2 + 2 + len(topic) + 1)
+        struct.pack_into("!H", self.buf, i, pid)
+        i = self._put_str(i + 2, topic)
+        self.buf[i] = qos
+        return i + 1
+
+
+def _bytes(s):
+    return s.encode() if isinstance(s, str) else s
+
+
+class PacketReader:
+    # Receive side: the client reads from its socket into space(), reports
+    # the byte count with filled(), and next() parses the packets out of the
+    # buffer in place. After next() the packet is described by header and
+    # the body offsets; body() and the topic/msg of parse_publish() are
+    # views into the buffer, valid until space() is called again. A packet
+    # larger than the buffer grows it.
+    def __init__(self, size=256):
+        self.buf = bytearray(size)
+        self.mv = memoryview(self.buf)
+        self.start = 0
+        self.end = 0
+        self.header = 0
+        self.body_start = 0
+        self.body_end = 0
+        self.topic = None
+        self.msg = None
+        self.pid = 0
+
+    def reset(self):
+        self.start = self.end = 0
+        self.topic = self.msg = None
+
+    def space(self):
+        # Moves a partially received packet to the front, so the rest fits behind it
+        start = self.start
+        if start:
+            n = self.end - start
+            if n:
+                self.buf[:n] = self.mv[start:self.end]
+            self.start = 0
+            self.end = n
+        if self.end == len(self.buf):
+            buf = bytearray(2 * len(self.buf))
+            buf[:self.end] = self.buf
+            self.buf = buf
+            self.mv = memoryview(buf)
+        if not self.end:
+            return self.mv  # The usual case, no view to allocate
+        return self.mv[self.end:]
+
+    def filled(self, n):
+        self.end += n
+
+    def next(self):
+        # True once a complete packet has been taken off the buffer
+        buf = self.buf
+        end = self.end
+        i = self.start + 1
+        sz = 0
+        sh = 0
+        while 1:
+            if i >= end:
+                return False
+            b = buf[i]
+            i += 1
+            sz |= (b & 0x7F) << sh
+            if not b & 0x80:
+                break
+            sh += 7
+        if i + sz > end:
+            return False
+        self.header = buf[self.start]
+        self.body_start = i
+        self.body_end = self.start = i + sz
+        return True
+
+    def body(self):
+        return self.mv[self.body_start:self.body_end]
+
+    def packet_id(self):
+        # Of an ack, or any packet whose variable header starts with one
+        i = self.body_start
+        return self.buf[i] << 8 | self.buf[i + 1]
+
+    def parse_publish(self):
+        buf = self.buf
+        i = self.body_start
+        n = buf[i] << 8 | buf[i + 1]
+        i += 2
+        self.topic = self.mv[i:i + n]
+        i += n
+        self.pid = 0
+        if self.header & 6:
+            self.pid = buf[i] << 8 | buf[i + 1]
+            i += 2
+        self.msg = self.mv[i:self.body_end]
@@ -2,6 +2,8 @@ import socket
 import struct
 from binascii import hexlify
 
+from umqtt.packet import PacketBuilder, PacketReader
+
 
 class MQTTException(Exception):
     pass
@@ -34,20 +36,9 @@ class MQTTClient:
         self.lw_msg = None
         self.lw_qos = 0
         self.lw_retain = False
-
-    def _send_str(self, s):
-        self.sock.write(struct.pack("!H", len(s)))
-        self.sock.write(s)
-
-    def _recv_len(self):
-        n = 0
-        sh = 0
-        while 1:
-            b = self.sock.read(1)[0]
-            n |= (b & 0x7F) << sh
-            if not b & 0x80:
-                return n
-            sh += 7
+        self._packet = PacketBuilder()
+        self._rx = PacketReader()
+        self._puback = bytearray(b"\x40\x02\0\0")
 
     def set_callback(self, f):
         self.cb = f
@@ -66,45 +57,16 @@ class MQTTClient:
         self.sock.connect(addr)
         if self.ssl:
             self.sock = self.ssl.wrap_socket(self.sock, server_hostname=self.server)
-        premsg = bytearray(b"\x10\0\0\0\0\0")
-        msg = bytearray(b"\x04MQTT\x04\x02\0\0")
-
-        sz = 10 + 2 + len(self.client_id)
-        msg[6] = clean_session << 1
-        if self.user:
-            sz += 2 + len(self.user) + 2 + len(self.pswd)
-            msg[6] |= 0xC0
-        if self.keepalive:
-            assert self.keepalive < 65536
-            msg[7] |= self.keepalive >> 8
-            msg[8] |= self.keepalive & 0x00FF
-        if self.lw_topic:
-            sz += 2 + len(self.lw_topic) + 2 + len(self.lw_msg)
-            msg[6] |= 0x4 | (self.lw_qos & 0x1) << 3 | (self.lw_qos & 0x2) << 3
-            msg[6] |= self.lw_retain << 5
-
-        i = 1
-        while sz > 0x7F:
-            premsg[i] = (sz & 0x7F) | 0x80
-            sz >>= 7
-            i += 1
-        premsg[i] = sz
-
-        self.sock.write(premsg, i + 2)
-        self.sock.write(msg)
-        # print(hex(len(msg)), hexlify(msg, ":"))
-        self._send_str(self.client_id)
-        if self.lw_topic:
-            self._send_str(self.lw_topic)
-            self._send_str(self.lw_msg)
-        if self.user:
-            self._send_str(self.user)
-            self._send_str(self.pswd)
-        resp = self.sock.read(4)
-        assert resp[0] == 0x20 and resp[1] == 0x02
-        if resp[3] != 0:
-            raise MQTTException(resp[3])
-        return resp[2] & 1
+        n = self._packet.connect(self.client_id, clean_session, self.keepalive, self.user, self.pswd,
+                                 self.lw_topic, self.lw_msg, self.lw_qos, self.lw_retain)
+        self.sock.write(self._packet.buf, n)
+        self._rx.reset()
+        op = self.wait_msg()
+        resp = self._rx.body()
+        assert op == 0x20 and len(resp) == 2
+        if resp[1] != 0:
+            raise MQTTException(resp[1])
+        return resp[0] & 1
 
     def disconnect(self):
         self.sock.write(b"\xe0\0")
@@ -114,92 +76,63 @@ class MQTTClient:
         self.sock.write(b"\xc0\0")
 
     def publish(self, topic, msg, retain=False, qos=0):
-        pkt = bytearray(b"\x30\0\0\0")
-        pkt[0] |= qos << 1 | retain
-        sz = 2 + len(topic) + len(msg)
-        if qos > 0:
-            sz += 2
-        assert sz < 2097152
-        i = 1
-        while sz > 0x7F:
-            pkt[i] = (sz & 0x7F) | 0x80
-            sz >>= 7
-            i += 1
-        pkt[i] = sz
-        # print(hex(len(pkt)), hexlify(pkt, ":"))
-        self.sock.write(pkt, i + 1)
-        self._send_str(topic)
         if qos > 0:
             self.pid += 1
             pid = self.pid
-            struct.pack_into("!H", pkt, 0, pid)
-            self.sock.write(pkt, 2)
-        self.sock.write(msg)
+        n = self._packet.publish(topic, msg, retain, qos, self.pid)
+        self.sock.write(self._packet.buf, n)
         if qos == 1:
             while 1:
                 op = self.wait_msg()
-                if op == 0x40:
-                    sz = self.sock.read(1)
-                    assert sz == b"\x02"
-                    rcv_pid = self.sock.read(2)
-                    rcv_pid = rcv_pid[0] << 8 | rcv_pid[1]
-                    if pid == rcv_pid:
-                        return
+                if op == 0x40 and self._rx.packet_id() == pid:
+                    return
         elif qos == 2:
             assert 0
 
     def subscribe(self, topic, qos=0):
         assert self.cb is not None, "Subscribe callback is not set"
-        pkt = bytearray(b"\x82\0\0\0")
         self.pid += 1
-        struct.pack_into("!BH", pkt, 1, 2 + 2 + len(topic) + 1, self.pid)
-        # print(hex(len(pkt)), hexlify(pkt, ":"))
-        self.sock.write(pkt)
-        self._send_str(topic)
-        self.sock.write(qos.to_bytes(1, "little"))
+        n = self._packet.subscribe(topic, qos, self.pid)
+        self.sock.write(self._packet.buf, n)
         while 1:
             op = self.wait_msg()
             if op == 0x90:
-                resp = self.sock.read(4)
-                # print(resp)
-                assert resp[1] == pkt[2] and resp[2] == pkt[3]
-                if resp[3] == 0x80:
-                    raise MQTTException(resp[3])
+                resp = self._rx.body()
+                assert self._rx.packet_id() == self.pid
+                if resp[2] == 0x80:
+                    raise MQTTException(resp[2])
                 return
 
     # Wait for a single incoming MQTT message and process it.
     # Subscribed messages are delivered to a callback previously
-    # set by .set_callback() method. Other (internal) MQTT
-    # messages processed internally.
+    # set by .set_callback() method, as memoryviews into the receive
+    # buffer that are only valid during the call. Other (internal) MQTT
+    # messages processed internally; their body stays available
+    # as self._rx.body() until the next read.
     def wait_msg(self):
-        res = self.sock.read(1)
-        self.sock.setblocking(True)
-        if res is None:
-            return None
-        if res == b"":
-            raise OSError(-1)
-        if res == b"\xd0":  # PINGRESP
-            sz = self.sock.read(1)[0]
-            assert sz == 0
+        rx = self._rx
+        while not rx.next():
+            n = self.sock.readinto(rx.space())
+            self.sock.setblocking(True)
+            if n is None:
+                return None
+            if not n:
+                raise OSError(-1)
+            rx.filled(n)
+        return self._dispatch()
+
+    def _dispatch(self):
+        rx = self._rx
+        op = rx.header
+        if op == 0xD0:  # PINGRESP
             return None
-        op = res[0]
         if op & 0xF0 != 0x30:
             return op
-        sz = self._recv_len()
-        topic_len = self.sock.read(2)
-        topic_len = (topic_len[0] << 8) | topic_len[1]
-        topic = self.sock.read(topic_len)
-        sz -= topic_len + 2
-        if op & 6:
-            pid = self.sock.read(2)
-            pid = pid[0] << 8 | pid[1]
-            sz -= 2
-        msg = self.sock.read(sz)
-        self.cb(topic, msg)
+        rx.parse_publish()
+        self.cb(rx.topic, rx.msg)
         if op & 6 == 2:
-            pkt = bytearray(b"\x40\x02\0\0")
-            struct.pack_into("!H", pkt, 2, pid)
-            self.sock.write(pkt)
+            struct.pack_into("!H", self._puback, 2, rx.pid)
+            self.sock.write(self._puback)
         elif op & 6 == 4:
             assert 0
         return op
@@ -208,5 +141,10 @@ class MQTTClient:
     # If not, returns immediately with None. Otherwise, does
     # the same processing as wait_msg.
     def check_msg(self):
+        if self._rx.next():  # Already buffered, no read needed
+            return self._dispatch()
         self.sock.setblocking(False)
-        return self.wait_msg()
+        try:
+            return self.wait_msg()
+        finally:
+            self.sock.setblocking(True)
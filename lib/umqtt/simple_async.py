@@ -0,0 +1,312 @@
+import asyncio
+import errno
+import struct
+import time
+
+from umqtt.simple import MQTTException
+from umqtt.packet import PacketBuilder, PacketReader
+
+# asyncio counterpart of umqtt.simple: the same constructor and calls, but
+# every network operation is a coroutine on an asyncio stream, so other
+# tasks keep running while a packet is on the wire or an ack is outstanding.
+# Replies that do not arrive within `timeout` seconds close the connection
+# and raise OSError(ETIMEDOUT).
+#
+# QoS 1 publishing is pipelined: publish() returns once the message is
+# written, with up to `window` messages awaiting their PUBACK, and flush()
+# waits for all of them. Acks are matched by packet id in any order. A
+# message unacknowledged for `timeout` seconds is sent again with DUP set,
+# and after `retries` resends the connection is given up. Unacknowledged
+# messages outlive the connection and connect(clean_session=False) resends
+# them, unless discard() was called with the packet id publish() returned.
+#
+# Only one task reads the stream at a time, under a lock; whichever task is
+# waiting processes the incoming packets on behalf of all of them.
+
+
+class MQTTClient:
+    def __init__(
+        self,
+        client_id,
+        server,
+        port=0,
+        user=None,
+        password=None,
+        keepalive=0,
+        ssl=None,
+        timeout=10,
+        window=1,
+        retries=2,
+    ):
+        if port == 0:
+            port = 8883 if ssl else 1883
+        self.client_id = client_id
+        self.reader = None
+        self.writer = None
+        self.server = server
+        self.port = port
+        self.ssl = ssl
+        self.pid = 0
+        self.cb = None
+        self.user = user
+        self.pswd = password
+        self.keepalive = keepalive
+        self.timeout = timeout
+        self.window = window
+        self.retries = retries
+        self.lw_topic = None
+        self.lw_msg = None
+        self.lw_qos = 0
+        self.lw_retain = False
+        self._lock = asyncio.Lock()
+        self._pending = {}  # pid -> [topic, msg, retain, sent ticks_ms, resends]
+        self._suback = 0  # Packet id of the last SUBACK
+        self._suback_code = 0
+        self._pongs = 0  # PINGRESPs received
+        self._free = []
+        self._packet = PacketBuilder()
+        self._rx = PacketReader()
+        self._puback = bytearray(b"\x40\x02\0\0")
+
+    def _next_pid(self):
+        # 1..65535, 0 is not a valid packet id
+        self.pid = self.pid % 0xFFFF + 1
+        return self.pid
+
+    async def _reply(self, coro):
+        if self.timeout is None:
+            return await coro
+        try:
+            return await asyncio.wait_for(coro, self.timeout)
+        except asyncio.TimeoutError:
+            # A reply that never came leaves the session in an unknown state
+            self._close()
+            raise OSError(errno.ETIMEDOUT)
+
+    def _close(self):
+        if self.writer is not None:
+            try:
+                self.writer.close()
+            except OSError:
+                pass
+            self.reader = self.writer = None
+
+    def set_callback(self, f):
+        self.cb = f
+
+    def set_last_will(self, topic, msg, retain=False, qos=0):
+        assert 0 <= qos <= 2
+        assert topic
+        self.lw_topic = topic
+        self.lw_msg = msg
+        self.lw_qos = qos
+        self.lw_retain = retain
+
+    async def connect(self, clean_session=True):
+        self._close()
+        if self.ssl:
+            opening = asyncio.open_connection(self.server, self.port, ssl=self.ssl)
+        else:
+            opening = asyncio.open_connection(self.server, self.port)
+        self.reader, self.writer = await self._reply(opening)
+        self._rx.reset()
+        async with self._lock:
+            self._write(self._packet.connect(self.client_id, clean_session, self.keepalive, self.user, self.pswd,
+                                             self.lw_topic, self.lw_msg, self.lw_qos, self.lw_retain))
+            await self.writer.drain()
+            await self._reply(self._next_packet())
+        resp = self._rx.body()
+        assert self._rx.header == 0x20 and len(resp) == 2
+        if resp[1] != 0:
+            raise MQTTException(resp[1])
+        if clean_session:
+            for pid in list(self._pending):
+                self._release(pid)
+        elif self._pending:
+            self._resend(expired_only=False)
+            await self.writer.drain()
+        return resp[0] & 1
+
+    async def disconnect(self):
+        self.writer.write(b"\xe0\0")
+        writer = self.writer
+        try:
+            await writer.drain()
+        finally:
+            self._close()
+        await writer.wait_closed()
+
+    # With wait, returns once the broker answered; a broker silent
+    # for timeout seconds closes the connection with OSError(ETIMEDOUT).
+    async def ping(self, wait=False):
+        answered = self._pongs
+        self.writer.write(b"\xc0\0")
+        await self.writer.drain()
+        if wait:
+            await self._until(lambda: self._pongs != answered)
+
+    def _write(self, n):
+        # One write per packet, straight from the builder's buffer. Streams
+        # copy what they cannot send at once, so the buffer is free again.
+        self.writer.write(self._packet.mv[:n])
+
+    def _send_publish(self, topic, msg, retain, qos, pid, dup=False):
+        self._write(self._packet.publish(topic, msg, retain, qos, pid, dup))
+
+    async def publish(self, topic, msg, retain=False, qos=0):
+        assert qos < 2, "QoS 2 is not supported"
+        if qos == 0:
+            self._send_publish(topic, msg, retain, 0, 0)
+            await self.writer.drain()
+            return
+        await self._until(self._window_open)
+        pid = self._next_pid()
+        entry = self._free.pop() if self._free else [None, None, False, 0, 0]
+        entry[0] = topic
+        entry[1] = msg
+        entry[2] = retain
+        entry[3] = time.ticks_ms()
+        entry[4] = 0
+        self._pending[pid] = entry
+        self._send_publish(topic, msg, retain, 1, pid)
+        await self.writer.drain()
+        return pid
+
+    # Gives up on a QoS 1 message: it is no longer resent or waited for.
+    # For callers that retry or store the message themselves.
+    def discard(self, pid):
+        self._release(pid)
+
+    # Waits until every QoS 1 message published so far is acknowledged.
+    async def flush(self):
+        await self._until(self._flushed)
+
+    def _release(self, pid):
+        # Pending entries are recycled, so publishing at a steady rate allocates none
+        entry = self._pending.pop(pid, None)
+        if entry is not None:
+            entry[0] = entry[1] = None
+            self._free.append(entry)
+
+    def _window_open(self):
+        return len(self._pending) < self.window
+
+    def _flushed(self):
+        return not self._pending
+
+    def _resend(self, expired_only=True):
+        now = time.ticks_ms()
+        for pid, entry in self._pending.items():
+            if expired_only:
+                if time.ticks_diff(now, entry[3]) < self.timeout * 1000:
+                    continue
+                if entry[4] >= self.retries:
+                    self._close()
+                    raise OSError(errno.ETIMEDOUT)
+                entry[4] += 1
+            entry[3] = now
+            self._send_publish(entry[0], entry[1], entry[2], 1, pid, True)
+
+    async def _until(self, done):
+        # Whichever waiting task holds the lock reads packets for all of them
+        while not done():
+            async with self._lock:
+                if not done():
+                    await self._receive()
+
+    async def _fill(self):
+        # One read into the receive buffer; cancelling it loses no data
+        rx = self._rx
+        n = await self.reader.readinto(rx.space())
+        if not n:
+            self._close()
+            raise OSError(-1)
+        rx.filled(n)
+
+    async def _next_packet(self):
+        while not self._rx.next():
+            await self._fill()
+
+    async def _receive(self):
+        # Handles one buffered packet, else reads more or resends the publishes whose ack is overdue
+        if self._rx.next():
+            await self._handle()
+            return
+        if self.reader is None:
+            raise OSError(errno.ENOTCONN)
+        if self.timeout is None:
+            await self._fill()
+            return
+        timeout = self.timeout
+        if self._pending:
+            now = time.ticks_ms()
+            oldest = max(time.ticks_diff(now, entry[3]) for entry in self._pending.values())
+            timeout = max(0, timeout - oldest / 1000)
+        try:
+            await asyncio.wait_for(self._fill(), timeout)
+        except asyncio.TimeoutError:
+            if not self._pending:
+                self._close()
+                raise OSError(errno.ETIMEDOUT)
+            self._resend()
+            await self.writer.drain()
+
+    async def subscribe(self, topic, qos=0):
+        assert self.cb is not None, "Subscribe callback is not set"
+        pid = self._next_pid()
+        self._suback = 0
+        self._write(self._packet.subscribe(topic, qos, pid))
+        await self.writer.drain()
+        await self._until(lambda: self._suback == pid)
+        if self._suback_code == 0x80:
+            raise MQTTException(self._suback_code)
+
+    # Wait for a single incoming MQTT message and process it.
+    # Subscribed messages are delivered to a callback previously
+    # set by .set_callback() method, as memoryviews into the receive
+    # buffer that are only valid during the call. Other (internal) MQTT
+    # messages processed internally.
+    async def wait_msg(self):
+        async with self._lock:
+            await self._next_packet()
+            return await self._handle()
+
+    async def _handle(self):
+        rx = self._rx
+        op = rx.header
+        if op == 0xD0:  # PINGRESP
+            self._pongs += 1
+            return None
+        if op == 0x40:  # PUBACK, in any order
+            self._release(rx.packet_id())
+            return op
+        if op == 0x90:  # SUBACK
+            self._suback_code = rx.body()[2]
+            self._suback = rx.packet_id()
+            return op
+        if op & 0xF0 != 0x30:
+            return op
+        rx.parse_publish()
+        self.cb(rx.topic, rx.msg)
+        if op & 6 == 2:
+            struct.pack_into("!H", self._puback, 2, rx.pid)
+            self.writer.write(self._puback)
+            await self.writer.drain()
+        elif op & 6 == 4:
+            assert 0
+        return op
+
+    # Checks whether a message from server starts arriving within
+    # timeout seconds. If not, or another task is mid-exchange, returns
+    # None. Otherwise, does the same processing as wait_msg.
+    async def check_msg(self, timeout=0.05):
+        if self._lock.locked():
+            return None
+        async with self._lock:
+            if not self._rx.next():
+                try:
+                    await asyncio.wait_for(self._fill(), timeout)
+                except asyncio.TimeoutError:
+                    return None
+                await self._reply(self._next_packet())
+            return await self._handle()
@@ -20,17 +20,26 @@ class Logger:
     def set_level(self, level):
         self.level = level
 
-    def log(self, level, msg):
+    def enabled_for(self, level) -> bool:
+        return level >= self.level
+
+    # msg is formatted only once the level check passed: either a %-style
+    # format string with args, or a callable returning the final message.
+    def log(self, level, msg, *args):
         if level < self.level:
             return
+        if callable(msg):
+            msg = msg()
+        elif args:
+            msg = msg % args
         t = time.ticks_ms()  # uptime in ms
         level_name = self.level_names.get(level, "?")
         print(f"[{t:>8} ms ][ {level_name:5} ] {msg}")
 
-    def debug(self, msg):   self.log(self.DEBUG, msg)
-    def info(self, msg):    self.log(self.INFO, msg)
-    def warning(self, msg): self.log(self.WARNING, msg)
-    def error(self, msg):   self.log(self.ERROR, msg)
+    def debug(self, msg, *args):   self.log(self.DEBUG, msg, *args)
+    def info(self, msg, *args):    self.log(self.INFO, msg, *args)
+    def warning(self, msg, *args): self.log(self.WARNING, msg, *args)
+    def error(self, msg, *args):   self.log(self.ERROR, msg, *args)
 
 # --- Singleton instance ---
 log = Logger()
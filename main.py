@@ -9,6 +9,7 @@ from homeassistantclient import HomeAssistantClient
 from controlbutton import ControlButton
 from statusled import StatusLed
 from soilmoisturesensor import SoilMoistureSensor
+from samplefilters import FilterChain, HampelFilter, MedianOfMeans
 from statecontroller import StateController
 
 async def main():
@@ -17,7 +18,12 @@ async def main():
     ha_client = HomeAssistantClient("ZEYA", "pool-side-X", "192.168.1.34")
     button = ControlButton(Pushbutton(Pin(17, Pin.IN, Pin.PULL_UP)))
     led = StatusLed(RGBLED(red=12, green=11, blue=10, active_high=False))
-    soilSensor = SoilMoistureSensor(AADC(ADC(27)), Pin(26, Pin.OUT, value=0), probe_count=100, probe_interval=0.2)
+    probe_count = 40
+    group_size = 8
+    soilSensor = SoilMoistureSensor(AADC(ADC(27)), Pin(26, Pin.OUT, value=0), probe_count=probe_count,
+                                    mode=SoilMoistureSensor.BURST, oversample=16, burst_period_us=500, settle_time=0.2,
+                                    sample_filter=FilterChain(HampelFilter(window=7)),
+                                    estimator=MedianOfMeans(group_size=group_size, max_groups=probe_count // group_size))
 
     controller = StateController(ha_client, button, led, soilSensor, wakeup_interval=400)
     await controller.run()
@@ -1,13 +1,54 @@
 import array
 
-def percentile(data, q) -> float :
-    if not isinstance(data, array.array):
-        raise TypeError("data must be array.array")
-    n = len(data)
-    if n == 0:
-        raise ValueError("empty array")
+from kernels import sum_u16, minmax_u16, sumsq_u16, histogram_u16
+
+# Vectorised backend, chosen once at import: ulab on MicroPython, NumPy on a
+# CPython host (offline reprocessing of recorded histories). Without either
+# the scalar code is used as is.
+try:
+    from ulab import numpy as np
+    BACKEND = "ulab"
+except ImportError:
+    try:
+        import numpy as np
+        BACKEND = "numpy"
+    except ImportError:
+        np = None
+        BACKEND = "python"
+
+def to_vector(data, exact_int : bool = False) :
+    # Always a copy. ulab's widest dtype is float; NumPy can keep u16 samples exact in int64
+    if BACKEND == "numpy":
+        return np.asarray(data, dtype=np.int64 if exact_int else np.float64)
+    return np.array(data, dtype=np.float)
 
-    values = sorted(data)
+def store_vector(vector, out, offset : int = 0) :
+    # Writes a vector back into a u16 array (or a writable memoryview of one)
+    if BACKEND == "numpy":
+        np.frombuffer(out, dtype=np.uint16)[offset:offset + len(vector)] = vector
+    else:
+        for i in range(len(vector)):
+            out[offset + i] = int(vector[i])
+
+def sliding_windows(vector, window : int) :
+    # Row j holds vector[j : j + window]; built column by column, so only plain
+    # slicing is needed and ulab and NumPy behave the same
+    rows = len(vector) - window + 1
+    windows = np.zeros((rows, window), dtype=vector.dtype)
+    for k in range(window):
+        windows[:, k] = vector[k:k + rows]
+    return windows
+
+def median_rows(windows) :
+    window = windows.shape[1]
+    ordered = np.sort(windows, axis=1)
+    if window & 1:
+        return ordered[:, window >> 1]
+    # Floor of the midpoint, matching the integer streaming stages
+    return np.floor((ordered[:, (window >> 1) - 1] + ordered[:, window >> 1]) / 2)
+
+def _quantile_sorted(values, q) -> float :
+    n = len(values)
     rank = (q / 100) * (n - 1)
     i = int(rank)
     frac = rank - i
@@ -15,16 +56,216 @@ def percentile(data, q) -> float :
         return values[i] + (values[i+1] - values[i]) * frac
     else:
         return float(values[i])
-    
-def average(data : array.array) -> float :
-    if not isinstance(data, array.array):
-        raise TypeError("data must be array.array")
+
+def sort_in_place(data) :
+    # data is a u16 array or a view of one. The built-in sort is compiled, so sorting
+    # a copy and writing it back in one slice beats any sort written in Python.
+    data[:] = array.array('H', sorted(data))
+
+def percentile(data, q) -> float :
+    if not isinstance(data, (array.array, memoryview)):
+        raise TypeError("data must be array.array or memoryview")
+    n = len(data)
+    if n == 0:
+        raise ValueError("empty array")
+
+    if np is not None:
+        return float(_quantile_sorted(np.sort(to_vector(data)), q))
+    return _quantile_sorted(sorted(data), q)
+
+def average(data) -> float :
+    if not isinstance(data, (array.array, memoryview)):
+        raise TypeError("data must be array.array or memoryview")
     n = len(data)
     if n == 0:
         raise ValueError("empty array")
+    if np is not None:
+        return float(np.mean(to_vector(data)))
     return sum(data) / n
 
+def variance(data) -> float :
+    # Population variance
+    if not isinstance(data, (array.array, memoryview)):
+        raise TypeError("data must be array.array or memoryview")
+    n = len(data)
+    if n == 0:
+        raise ValueError("empty array")
+    if np is not None:
+        return float(np.std(to_vector(data))) ** 2
+    mean = sum(data) / n
+    total = 0.0
+    for value in data:
+        total += (value - mean) * (value - mean)
+    return total / n
+
+def isqrt(value : int) -> int :
+    # Integer square root (Newton), keeps integer-only paths free of floats
+    if value < 0:
+        raise ValueError("square root of negative number")
+    if value < 2:
+        return value
+    x = value
+    y = (x + 1) >> 1
+    while y < x:
+        x = y
+        y = (x + value // x) >> 1
+    return x
+
 def percentage_in_bounds(value, lower, upper) -> float :
     if lower == upper:
         raise ValueError("lower and upper bounds must differ")
     return min(100.0, max(0.0, (value - lower) * 100.0 / (upper - lower)))
+
+class SampleStats:
+    # Statistics of a u16 sample buffer. Min, max, mean and variance come from
+    # the compiled reduction kernels, one tight loop each. Quantiles need
+    # ordered data, so when any are requested the buffer is sorted IN PLACE once
+    # and every quantile is read from it - the caller's sample order is lost.
+    # Passing a Histogram answers the quantiles from bin counts instead and
+    # leaves the buffer untouched; an empty histogram is filled from data.
+    def __init__(self, data, quantiles = (), histogram = None) -> None :
+        if not isinstance(data, (array.array, memoryview)):
+            raise TypeError("data must be array.array or memoryview")
+        n = len(data)
+        if n == 0:
+            raise ValueError("empty array")
+
+        lo, hi = minmax_u16(data)
+        total = sum_u16(data)
+        total_sq = sumsq_u16(data)
+
+        self.count : int = n
+        self.min : int = lo
+        self.max : int = hi
+        self.sum : int = total
+        self.mean : float = total / n
+        # Integer sums keep this exact, no catastrophic cancellation
+        self.variance : float = (n * total_sq - total * total) / (n * n)
+
+        self._data = data
+        self._sorted = False
+        self._histogram = histogram
+        if histogram is not None and histogram.count == 0:
+            histogram.add_all(data)
+        self.quantiles = {}
+        for q in quantiles:
+            self.quantiles[q] = self.quantile(q)
+
+    def quantile(self, q) -> float :
+        if self._histogram is not None:
+            return self._histogram.quantile(q)
+        if not self._sorted:
+            sort_in_place(self._data)
+            self._sorted = True
+        return _quantile_sorted(self._data, q)
+
+    def stddev(self) -> float :
+        return self.variance ** 0.5
+
+    def __str__(self) -> str :
+        text = f"Min: {self.min}, Max: {self.max}, Avg: {self.mean}, Var: {self.variance}"
+        for q in self.quantiles:
+            text += f", P{q}: {self.quantiles[q]}"
+        return text
+
+class Histogram:
+    # Counting-select quantiles for bounded u16 data. Samples are binned by
+    # their top `bits` bits into a reusable array('H') (4096 bins = 8 KB for a
+    # 12-bit ADC), so a quantile query walks the counts with no sort and no
+    # copy of the samples. Only the span between the lowest and highest bin
+    # in use is walked or cleared, which is narrow for sensor noise. Samples
+    # can be added one by one while they are acquired, or a whole buffer at
+    # once. A bin holds at most 65535 samples. Quantiles are approximate: a
+    # sample is reported at the midpoint of its bin, exact only with bits == 16.
+    # Sorting (see SampleStats) is faster, but allocates a list the size of
+    # the data; the histogram allocates nothing per query.
+    def __init__(self, bits : int = 12) -> None :
+        if bits < 1 or bits > 16:
+            raise ValueError("bits must be between 1 and 16")
+        self._shift = 16 - bits
+        self._counts = array.array('H', (0 for _ in range(1 << bits)))
+        self._lo = len(self._counts)  # Bins in use, empty while _lo > _hi
+        self._hi = -1
+        self.count : int = 0
+
+    def reset(self) :
+        counts = self._counts
+        for i in range(self._lo, self._hi + 1):
+            counts[i] = 0
+        self._lo = len(counts)
+        self._hi = -1
+        self.count = 0
+
+    def add(self, value : int) :
+        i = value >> self._shift
+        self._counts[i] += 1
+        if i < self._lo:
+            self._lo = i
+        if i > self._hi:
+            self._hi = i
+        self.count += 1
+
+    def add_all(self, data) :
+        if not len(data):
+            return
+        histogram_u16(data, self._counts, self._shift)
+        lo, hi = minmax_u16(data)
+        self._lo = min(self._lo, lo >> self._shift)
+        self._hi = max(self._hi, hi >> self._shift)
+        self.count += len(data)
+
+    def _value_at(self, rank : int) -> int :
+        # Value of the sample at 0-based rank in sorted order, as its bin midpoint
+        seen = 0
+        counts = self._counts
+        for i in range(self._lo, self._hi + 1):
+            seen += counts[i]
+            if seen > rank:
+                return (i << self._shift) + ((1 << self._shift) >> 1)
+        raise ValueError("rank out of range")
+
+    def quantile(self, q) -> float :
+        # Same linear interpolation between ranks as percentile()
+        n = self.count
+        if n == 0:
+            raise ValueError("empty histogram")
+        rank = (q / 100) * (n - 1)
+        i = int(rank)
+        frac = rank - i
+        lo = self._value_at(i)
+        if i + 1 < n and frac:
+            return lo + (self._value_at(i + 1) - lo) * frac
+        return float(lo)
+
+class RunningStats:
+    # Welford's streaming mean/variance: O(1) memory, numerically stable
+    def __init__(self) -> None :
+        self.reset()
+
+    def reset(self) :
+        self.count : int = 0
+        self.mean : float = 0.0
+        self._m2 : float = 0.0
+
+    def add(self, value) :
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+
+    def variance(self) -> float :
+        # Sample variance, the mean's confidence interval is built from it
+        if self.count < 2:
+            return 0.0
+        return self._m2 / (self.count - 1)
+
+    def confidence_halfwidth(self, z : float = 1.96) -> float :
+        if self.count == 0:
+            raise ValueError("no samples")
+        return z * (self.variance() / self.count) ** 0.5
+
+    def converged(self, tolerance : float, z : float = 1.96) -> bool :
+        # Same test as confidence_halfwidth() <= tolerance, without the sqrt
+        if self.count < 2:
+            return False
+        return z * z * self.variance() <= tolerance * tolerance * self.count
@@ -0,0 +1,119 @@
+import array
+
+class Measurement:
+    # One soil moisture reading. __slots__ keeps the instance to a fixed set of
+    # fields with no per-object dict.
+    __slots__ = ("timestamp", "raw_mean", "percent", "spread", "sample_count", "duration")
+
+    def __init__(self, timestamp : int = 0, raw_mean : int = -1, percent : int = -1, spread : int = 0,
+                 sample_count : int = 0, duration : int = 0) -> None :
+        self.timestamp : int = timestamp        # time.time() seconds
+        self.raw_mean : int = raw_mean          # Estimated raw ADC level
+        self.percent : int = percent            # Calibrated moisture percentage
+        self.spread : int = spread              # Standard deviation of the probes, raw ADC units
+        self.sample_count : int = sample_count  # Probes that went into the reading
+        self.duration : int = duration          # Acquisition time in ms
+
+    def __str__(self) -> str :
+        return (f"Measurement(t={self.timestamp}, raw={self.raw_mean}, percent={self.percent}, "
+                f"spread={self.spread}, samples={self.sample_count}, duration={self.duration} ms)")
+
+class MeasurementHistory:
+    # Fixed-size in-RAM ring of the latest readings. Fields live in parallel
+    # array columns, so a record costs a few bytes instead of an object, and
+    # trend queries walk the columns without creating any Measurement.
+    def __init__(self, capacity : int = 96) -> None :
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self._capacity = capacity
+        self._timestamps = array.array('L', (0 for _ in range(capacity)))
+        self._raw_means = array.array('H', (0 for _ in range(capacity)))
+        self._percents = array.array('B', (0 for _ in range(capacity)))
+        self._spreads = array.array('H', (0 for _ in range(capacity)))
+        self._sample_counts = array.array('H', (0 for _ in range(capacity)))
+        self._durations = array.array('L', (0 for _ in range(capacity)))
+        self._head = 0  # Slot of the next append
+        self._count = 0
+
+    def __len__(self) -> int :
+        return self._count
+
+    def clear(self) :
+        self._head = 0
+        self._count = 0
+
+    def append(self, m : Measurement) :
+        i = self._head
+        self._timestamps[i] = m.timestamp
+        self._raw_means[i] = m.raw_mean
+        self._percents[i] = m.percent
+        self._spreads[i] = m.spread
+        self._sample_counts[i] = m.sample_count
+        self._durations[i] = m.duration
+        self._head = (i + 1) % self._capacity
+        if self._count < self._capacity:
+            self._count += 1
+
+    def _slot(self, index : int) -> int :
+        # index 0 is the oldest record, -1 the newest
+        if index < 0:
+            index += self._count
+        if index < 0 or index >= self._count:
+            raise IndexError("history index out of range")
+        return (self._head - self._count + index) % self._capacity
+
+    def read(self, index : int, into : Measurement = None) -> Measurement :
+        # Pass `into` to reuse a record instead of allocating one
+        i = self._slot(index)
+        m = into if into is not None else Measurement()
+        m.timestamp = self._timestamps[i]
+        m.raw_mean = self._raw_means[i]
+        m.percent = self._percents[i]
+        m.spread = self._spreads[i]
+        m.sample_count = self._sample_counts[i]
+        m.duration = self._durations[i]
+        return m
+
+    def percent_at(self, index : int) -> int :
+        return self._percents[self._slot(index)]
+
+    def timestamp_at(self, index : int) -> int :
+        return self._timestamps[self._slot(index)]
+
+    def _window(self, last : int) -> int :
+        if self._count == 0:
+            raise ValueError("empty history")
+        return self._count if last <= 0 or last > self._count else last
+
+    def mean_percent(self, last : int = 0) -> int :
+        # Integer mean over the newest `last` records (0 = all)
+        n = self._window(last)
+        total = 0
+        for index in range(self._count - n, self._count):
+            total += self._percents[self._slot(index)]
+        return total // n
+
+    def percent_change(self, last : int = 0) -> int :
+        # Newest minus oldest percentage within the newest `last` records (0 = all)
+        n = self._window(last)
+        return self.percent_at(-1) - self.percent_at(self._count - n)
+
+    def percent_per_hour(self, last : int = 0) -> float :
+        # Least-squares slope of percent over time within the newest `last` records
+        n = self._window(last)
+        if n < 2:
+            return 0.0
+        t0 = self.timestamp_at(self._count - n)
+        sum_t = sum_p = sum_tt = sum_tp = 0
+        for index in range(self._count - n, self._count):
+            i = self._slot(index)
+            t = self._timestamps[i] - t0
+            p = self._percents[i]
+            sum_t += t
+            sum_p += p
+            sum_tt += t * t
+            sum_tp += t * p
+        denominator = n * sum_tt - sum_t * sum_t
+        if denominator == 0:
+            return 0.0
+        return (n * sum_tp - sum_t * sum_p) * 3600 / denominator
@@ -0,0 +1,71 @@
+import asyncio
+from time import ticks_ms, ticks_diff
+
+from logger import log
+from measurement import Measurement, MeasurementHistory
+
+class MeasurementCache:
+    # Latest soil moisture Measurement of a sensor, timestamped on arrival.
+    # Consumers ask for a reading no older than max_age seconds: they get the
+    # cached one while it is fresh, otherwise they join the measurement already
+    # in flight, and only when none is running a single new one is started.
+    # Every new reading is also appended to the optional history ring.
+    def __init__(self, sensor, history : MeasurementHistory = None) -> None :
+        self._sensor = sensor
+        self._history = history
+        self._in_flight = False
+        self._done = asyncio.Event()
+        self._error = None
+
+        self.latest : Measurement = None
+        self._received : int = 0  # ticks_ms of the latest reading
+
+    @property
+    def value(self) -> int :
+        # Moisture percentage, -1 until the first reading
+        return self.latest.percent if self.latest is not None else -1
+
+    def is_valid(self) -> bool :
+        return self.latest is not None
+
+    def age_ms(self) -> int :
+        return ticks_diff(ticks_ms(), self._received)
+
+    def is_fresh(self, max_age : float) -> bool :
+        return self.is_valid() and self.age_ms() < max_age * 1000
+
+    def update(self, measurement : Measurement, record : bool = True) :
+        self.latest = measurement
+        self._received = ticks_ms()
+        if record and self._history is not None:
+            self._history.append(measurement)
+
+    def invalidate(self) :
+        self.latest = None
+
+    async def get(self, max_age : float = 0) -> Measurement :
+        if self.is_fresh(max_age):
+            return self.latest
+        if self._in_flight:
+            log.debug("Joining measurement already in progress")
+            await self._done.wait()
+            if self._error is not None:
+                raise self._error
+            return self.latest
+        return await self._measure()
+
+    async def _measure(self) -> Measurement :
+        self._in_flight = True
+        self._error = None
+        self._done.clear()
+        try:
+            measurement = await self._sensor.measure()
+            self.update(measurement)
+            log.debug("%s", measurement)
+            return measurement
+        except Exception as e:
+            self._error = e
+            raise
+        finally:
+            self._in_flight = False
+            self._done.set()
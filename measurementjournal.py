@@ -0,0 +1,78 @@
+import struct
+
+from logger import log
+from fileutils import BinaryFileUtil
+
+# Store-and-forward journal of readings that could not be published.
+# Records are fixed size and appended to flash as is, little endian:
+#   timestamp u32 (time.time()), probe u16, moisture percentage u16
+# A separate file keeps the cursor, the index of the first record not yet
+# confirmed by the broker, so a reboot resumes the drain where it stopped.
+# Once everything is drained both files are deleted and the journal starts
+# over empty.
+
+_RECORD = "<IHH"
+RECORD_SIZE = struct.calcsize(_RECORD)
+
+class MeasurementJournal:
+    def __init__(self, path : str = "measurement-journal.bin", max_records : int = 4096, batch_size : int = 16) -> None :
+        self._file = BinaryFileUtil(path)
+        self._cursor_file = BinaryFileUtil(path + ".cursor")
+        self._max_records : int = max_records
+        self._record = bytearray(RECORD_SIZE)
+        self._cursor_buf = bytearray(4)
+        self._batch = bytearray(RECORD_SIZE * batch_size)
+        self._batch_view = memoryview(self._batch)
+
+        size = self._file.size()
+        self._count : int = size // RECORD_SIZE if size > 0 else 0
+        if size > 0 and size % RECORD_SIZE:
+            # A record torn by a reset mid-append would shift every record appended after it
+            log.warning("Journal %s ends with a partial record, dropping %d bytes", self._file.path, size % RECORD_SIZE)
+            self._file.truncate(self._count * RECORD_SIZE, self._batch)
+        self._cursor : int = 0
+        if self._cursor_file.read_into(self._cursor_buf, 4):
+            self._cursor = struct.unpack("<I", self._cursor_buf)[0]
+        if self._cursor > self._count:
+            log.warning("Journal cursor %d past its %d records, starting over", self._cursor, self._count)
+            self._reset()
+
+    def __len__(self) -> int :
+        # Records not yet drained
+        return self._count - self._cursor
+
+    def append(self, timestamp : int, probe : int, moisture : int) -> bool :
+        if self._count >= self._max_records:
+            log.warning("Journal %s is full, reading of %d dropped", self._file.path, timestamp)
+            return False
+        struct.pack_into(_RECORD, self._record, 0, timestamp, probe, moisture)
+        self._file.append(self._record)
+        self._count += 1
+        return True
+
+    def read_batch(self) -> int :
+        # Loads the oldest undrained records, up to batch_size; record() reads them back
+        count = min(len(self), len(self._batch) // RECORD_SIZE)
+        nbytes = count * RECORD_SIZE
+        if count and self._file.read_at(self._cursor * RECORD_SIZE, self._batch_view[:nbytes]) != nbytes:
+            raise ValueError("truncated journal: %s" % self._file.path)
+        return count
+
+    def record(self, index : int) -> tuple :
+        # (timestamp, probe, moisture) of record index of the last batch
+        return struct.unpack_from(_RECORD, self._batch, index * RECORD_SIZE)
+
+    def consume(self, count : int) :
+        # The first count records of the batch reached the broker
+        self._cursor += count
+        if self._cursor >= self._count:
+            self._reset()
+            return
+        struct.pack_into("<I", self._cursor_buf, 0, self._cursor)
+        self._cursor_file.rewrite(self._cursor_buf)
+
+    def _reset(self) :
+        self._file.delete()
+        self._cursor_file.delete()
+        self._count = 0
+        self._cursor = 0
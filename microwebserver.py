@@ -18,16 +18,6 @@ JOIN_TIMEOUT_S = 25
 STATUS_LOG_PERIOD_S = 1.0
 # ==================
 
-print("=== Pico W Captive Portal + Scanner + Join Test (Compat) ===")
-try:
-    network.country(COUNTRY)
-    print("[i] Regulatory domain set to {}".format(COUNTRY))
-except Exception as e:
-    print("[i] network.country() not available: {}".format(e))
-
-sta = network.WLAN(network.STA_IF)
-ap  = network.WLAN(network.AP_IF)
-
 def fmt_mac(mac):
     try:
         return ":".join("{:02X}".format(b) for b in mac)
@@ -37,16 +27,6 @@ def fmt_mac(mac):
         except Exception:
             return "?"
 
-print("[i] Resetting Wi-Fi state...")
-for iface, name in ((sta,"STA"), (ap,"AP")):
-    try:
-        if iface.active():
-            iface.active(False)
-            print("    - {} disabled".format(name))
-    except Exception as e:
-        print("    - {} disable error: {}".format(name, e))
-time.sleep(0.2)
-
 def ap_try_set(k, v):
     try:
         ap.config(**{k:v})
@@ -56,41 +36,64 @@ def ap_try_set(k, v):
         print("    - AP config {} unsupported: {}".format(k, e))
         return False
 
-print("[i] Configure OPEN AP...")
-if not ap_try_set("essid", SSID):
-    print("[!] 'essid' not accepted; cannot continue.")
-    sys.exit(1)
-for k,v in (("password",""),("key",""),("pwd",""),("authmode",0),("security",0)):
-    ap_try_set(k,v)
-
-print("[i] Activating AP...")
-ap.active(True)
-try:
-    sta.active(False)
-except Exception:
-    pass
-
-print("[i] Waiting for AP to be active...")
-for _ in range(50):
-    if ap.active():
-        break
-    time.sleep(0.1)
-if not ap.active():
-    raise RuntimeError("[!] AP failed to start")
-
-try:
-    ip, netmask, gw, dns = ap.ifconfig()
-except Exception as e:
-    print("[i] ifconfig failed: {}".format(e))
-    ip, netmask, gw, dns = AP_IP_FALLBACK
-
-print("[+] AP UP (OPEN)")
-print("    SSID : {}".format(SSID))
-print("    IP   : {}".format(ip))
-try:
-    print("    AP MAC: {}".format(fmt_mac(ap.config('mac'))))
-except Exception:
-    pass
+# Importing the module (benchmarks, tests) only defines the helpers; the
+# access point and the server loop start when it runs as the main script
+if __name__ == "__main__":
+    print("=== Pico W Captive Portal + Scanner + Join Test (Compat) ===")
+    try:
+        network.country(COUNTRY)
+        print("[i] Regulatory domain set to {}".format(COUNTRY))
+    except Exception as e:
+        print("[i] network.country() not available: {}".format(e))
+
+    sta = network.WLAN(network.STA_IF)
+    ap  = network.WLAN(network.AP_IF)
+
+    print("[i] Resetting Wi-Fi state...")
+    for iface, name in ((sta,"STA"), (ap,"AP")):
+        try:
+            if iface.active():
+                iface.active(False)
+                print("    - {} disabled".format(name))
+        except Exception as e:
+            print("    - {} disable error: {}".format(name, e))
+    time.sleep(0.2)
+
+    print("[i] Configure OPEN AP...")
+    if not ap_try_set("essid", SSID):
+        print("[!] 'essid' not accepted; cannot continue.")
+        sys.exit(1)
+    for k,v in (("password",""),("key",""),("pwd",""),("authmode",0),("security",0)):
+        ap_try_set(k,v)
+
+    print("[i] Activating AP...")
+    ap.active(True)
+    try:
+        sta.active(False)
+    except Exception:
+        pass
+
+    print("[i] Waiting for AP to be active...")
+    for _ in range(50):
+        if ap.active():
+            break
+        time.sleep(0.1)
+    if not ap.active():
+        raise RuntimeError("[!] AP failed to start")
+
+    try:
+        ip, netmask, gw, dns = ap.ifconfig()
+    except Exception as e:
+        print("[i] ifconfig failed: {}".format(e))
+        ip, netmask, gw, dns = AP_IP_FALLBACK
+
+    print("[+] AP UP (OPEN)")
+    print("    SSID : {}".format(SSID))
+    print("    IP   : {}".format(ip))
+    try:
+        print("    AP MAC: {}".format(fmt_mac(ap.config('mac'))))
+    except Exception:
+        pass
 
 # ---------- Utils ----------
 AUTH_MAP = {
@@ -628,169 +631,170 @@ def make_http_sock():
     print("[+] HTTP server on http://{}:{}/".format(ip, HTTP_PORT))
     return s
 
-dns_sock  = make_dns_sock()
-http_sock = make_http_sock()
+if __name__ == "__main__":
+    dns_sock  = make_dns_sock()
+    http_sock = make_http_sock()
 
-# ---------- Poll loop (no .fileno) ----------
-poll = uselect.poll()
-poll.register(dns_sock, uselect.POLLIN)
-poll.register(http_sock, uselect.POLLIN)
-http_conns = []
+    # ---------- Poll loop (no .fileno) ----------
+    poll = uselect.poll()
+    poll.register(dns_sock, uselect.POLLIN)
+    poll.register(http_sock, uselect.POLLIN)
+    http_conns = []
 
-try:
-    while True:
-        # register client sockets
-        for c in http_conns:
-            try:
-                poll.register(c, uselect.POLLIN)
-            except Exception:
-                pass
-
-        events = poll.poll(250)
-
-        # unregister again
-        for c in http_conns:
-            try:
-                poll.unregister(c)
-            except Exception:
-                pass
-
-        for sock_obj, event in events:
-            # DNS
-            if sock_obj is dns_sock and (event & uselect.POLLIN):
+    try:
+        while True:
+            # register client sockets
+            for c in http_conns:
                 try:
-                    data, addr = dns_sock.recvfrom(512)
-                    resp = build_dns_response(data, ip)
-                    if resp:
-                        dns_sock.sendto(resp, addr)
+                    poll.register(c, uselect.POLLIN)
                 except Exception:
                     pass
 
-            # HTTP listener
-            elif sock_obj is http_sock and (event & uselect.POLLIN):
+            events = poll.poll(250)
+
+            # unregister again
+            for c in http_conns:
                 try:
-                    conn, remote = http_sock.accept()
-                    conn.settimeout(6)
-                    http_conns.append(conn)
+                    poll.unregister(c)
                 except Exception:
                     pass
 
-            # Existing HTTP client
-            elif (sock_obj in http_conns) and (event & uselect.POLLIN):
-                try:
-                    method, path, qs, headers, body = read_http_request(sock_obj)
-
-                    if path in PROBE_PATHS:
-                        http_send(sock_obj, "HTTP/1.1 302 Found",
-                                  [("Location","/"), ("Cache-Control","no-store"),
-                                   ("Content-Length","0")], b"")
-
-                    elif path == "/" and method == "GET":
-                        body_html = page_root().encode()
-                        http_send(sock_obj, "HTTP/1.1 200 OK",
-                                  [("Content-Type","text/html; charset=utf-8"),
-                                   ("Cache-Control","no-store"),
-                                   ("Content-Length", str(len(body_html)))], body_html)
-
-                    elif path == "/networks" and method == "GET":
-                        nets = scan_networks()
-                        page = page_networks(nets).encode()
-                        http_send(sock_obj, "HTTP/1.1 200 OK",
-                                  [("Content-Type","text/html; charset=utf-8"),
-                                   ("Cache-Control","no-store"),
-                                   ("Content-Length", str(len(page)))], page)
-
-                    elif path == "/scan.json" and method == "GET":
-                        nets = scan_networks()
-                        items = []
-                        for n in nets:
-                            items.append('{{"ssid":"{ssid}","bssid":"{bssid}","channel":{ch},"rssi":{rssi},"security":"{sec}","hidden":{hid}}}'.format(
-                                ssid=(n["ssid"].replace('"','\\"') if n["ssid"] else ""),
-                                bssid=n["bssid"],
-                                ch=n["channel"], rssi=n["rssi"],
-                                sec=n["security"].replace('"','\\"'),
-                                hid="true" if n["hidden"] else "false"
-                            ))
-                        body_json = ("[" + ",".join(items) + "]").encode()
-                        http_send(sock_obj, "HTTP/1.1 200 OK",
-                                  [("Content-Type","application/json"),
-                                   ("Cache-Control","no-store"),
-                                   ("Content-Length", str(len(body_json)))], body_json)
-
-                    elif path == "/join" and method == "GET":
-                        params = parse_query(qs)
-                        ssid_param = params.get("ssid","")
-                        page = page_join_form(ssid_param).encode()
-                        http_send(sock_obj, "HTTP/1.1 200 OK",
-                                  [("Content-Type","text/html; charset=utf-8"),
-                                   ("Cache-Control","no-store"),
-                                   ("Content-Length", str(len(page)))], page)
-
-                    elif path == "/test-credentials" and method == "POST":
-                        ctype = headers.get("content-type","")
-                        if "application/x-www-form-urlencoded" in ctype:
-                            form = parse_form_urlencoded(body.decode())
-                            ssid = form.get("ssid","")
-                            password = form.get("password","")
-                            strict = form.get("strict","") in ("1","on","true","yes")
-                            ok, info = test_credentials(ssid, password, strict=strict)
-                            page = page_test_result(ssid, ok, info).encode()
-                            http_send(sock_obj, "HTTP/1.1 200 OK",
-                                      [("Content-Type","text/html; charset=utf-8"),
-                                       ("Cache-Control","no-store"),
-                                       ("Content-Length", str(len(page)))], page)
-                        else:
-                            msg = b"Unsupported Content-Type"
-                            http_send(sock_obj, "HTTP/1.1 415 Unsupported Media Type",
-                                      [("Content-Type","text/plain; charset=utf-8"),
-                                       ("Content-Length", str(len(msg)))], msg)
-
-                    else:
-                        msg = b"Not found"
-                        http_send(sock_obj, "HTTP/1.1 404 Not Found",
-                                  [("Content-Type","text/plain; charset=utf-8"),
-                                   ("Content-Length", str(len(msg)))], msg)
-
-                except Exception as e:
+            for sock_obj, event in events:
+                # DNS
+                if sock_obj is dns_sock and (event & uselect.POLLIN):
                     try:
-                        err = ("Error: %r" % e).encode()
-                        http_send(sock_obj, "HTTP/1.1 500 Internal Server Error",
-                                  [("Content-Type","text/plain; charset=utf-8"),
-                                   ("Content-Length", str(len(err)))], err)
+                        data, addr = dns_sock.recvfrom(512)
+                        resp = build_dns_response(data, ip)
+                        if resp:
+                            dns_sock.sendto(resp, addr)
                     except Exception:
                         pass
-                finally:
+
+                # HTTP listener
+                elif sock_obj is http_sock and (event & uselect.POLLIN):
                     try:
-                        http_conns.remove(sock_obj)
+                        conn, remote = http_sock.accept()
+                        conn.settimeout(6)
+                        http_conns.append(conn)
                     except Exception:
                         pass
+
+                # Existing HTTP client
+                elif (sock_obj in http_conns) and (event & uselect.POLLIN):
                     try:
-                        sock_obj.close()
-                    except Exception:
-                        pass
+                        method, path, qs, headers, body = read_http_request(sock_obj)
+
+                        if path in PROBE_PATHS:
+                            http_send(sock_obj, "HTTP/1.1 302 Found",
+                                      [("Location","/"), ("Cache-Control","no-store"),
+                                       ("Content-Length","0")], b"")
+
+                        elif path == "/" and method == "GET":
+                            body_html = page_root().encode()
+                            http_send(sock_obj, "HTTP/1.1 200 OK",
+                                      [("Content-Type","text/html; charset=utf-8"),
+                                       ("Cache-Control","no-store"),
+                                       ("Content-Length", str(len(body_html)))], body_html)
+
+                        elif path == "/networks" and method == "GET":
+                            nets = scan_networks()
+                            page = page_networks(nets).encode()
+                            http_send(sock_obj, "HTTP/1.1 200 OK",
+                                      [("Content-Type","text/html; charset=utf-8"),
+                                       ("Cache-Control","no-store"),
+                                       ("Content-Length", str(len(page)))], page)
+
+                        elif path == "/scan.json" and method == "GET":
+                            nets = scan_networks()
+                            items = []
+                            for n in nets:
+                                items.append('{{"ssid":"{ssid}","bssid":"{bssid}","channel":{ch},"rssi":{rssi},"security":"{sec}","hidden":{hid}}}'.format(
+                                    ssid=(n["ssid"].replace('"','\\"') if n["ssid"] else ""),
+                                    bssid=n["bssid"],
+                                    ch=n["channel"], rssi=n["rssi"],
+                                    sec=n["security"].replace('"','\\"'),
+                                    hid="true" if n["hidden"] else "false"
+                                ))
+                            body_json = ("[" + ",".join(items) + "]").encode()
+                            http_send(sock_obj, "HTTP/1.1 200 OK",
+                                      [("Content-Type","application/json"),
+                                       ("Cache-Control","no-store"),
+                                       ("Content-Length", str(len(body_json)))], body_json)
+
+                        elif path == "/join" and method == "GET":
+                            params = parse_query(qs)
+                            ssid_param = params.get("ssid","")
+                            page = page_join_form(ssid_param).encode()
+                            http_send(sock_obj, "HTTP/1.1 200 OK",
+                                      [("Content-Type","text/html; charset=utf-8"),
+                                       ("Cache-Control","no-store"),
+                                       ("Content-Length", str(len(page)))], page)
+
+                        elif path == "/test-credentials" and method == "POST":
+                            ctype = headers.get("content-type","")
+                            if "application/x-www-form-urlencoded" in ctype:
+                                form = parse_form_urlencoded(body.decode())
+                                ssid = form.get("ssid","")
+                                password = form.get("password","")
+                                strict = form.get("strict","") in ("1","on","true","yes")
+                                ok, info = test_credentials(ssid, password, strict=strict)
+                                page = page_test_result(ssid, ok, info).encode()
+                                http_send(sock_obj, "HTTP/1.1 200 OK",
+                                          [("Content-Type","text/html; charset=utf-8"),
+                                           ("Cache-Control","no-store"),
+                                           ("Content-Length", str(len(page)))], page)
+                            else:
+                                msg = b"Unsupported Content-Type"
+                                http_send(sock_obj, "HTTP/1.1 415 Unsupported Media Type",
+                                          [("Content-Type","text/plain; charset=utf-8"),
+                                           ("Content-Length", str(len(msg)))], msg)
 
-except KeyboardInterrupt:
-    print("\n[i] Stopping server...")
-finally:
-    for c in http_conns:
+                        else:
+                            msg = b"Not found"
+                            http_send(sock_obj, "HTTP/1.1 404 Not Found",
+                                      [("Content-Type","text/plain; charset=utf-8"),
+                                       ("Content-Length", str(len(msg)))], msg)
+
+                    except Exception as e:
+                        try:
+                            err = ("Error: %r" % e).encode()
+                            http_send(sock_obj, "HTTP/1.1 500 Internal Server Error",
+                                      [("Content-Type","text/plain; charset=utf-8"),
+                                       ("Content-Length", str(len(err)))], err)
+                        except Exception:
+                            pass
+                    finally:
+                        try:
+                            http_conns.remove(sock_obj)
+                        except Exception:
+                            pass
+                        try:
+                            sock_obj.close()
+                        except Exception:
+                            pass
+
+    except KeyboardInterrupt:
+        print("\n[i] Stopping server...")
+    finally:
+        for c in http_conns:
+            try:
+                c.close()
+            except Exception:
+                pass
         try:
-            c.close()
+            dns_sock.close(); print("[i] DNS socket closed")
         except Exception:
             pass
-    try:
-        dns_sock.close(); print("[i] DNS socket closed")
-    except Exception:
-        pass
-    try:
-        http_sock.close(); print("[i] HTTP socket closed")
-    except Exception:
-        pass
-    try:
-        ap.active(False); print("[i] AP disabled")
-    except Exception:
-        pass
-    try:
-        sta.active(False); print("[i] STA disabled")
-    except Exception:
-        pass
-    print("=== Shutdown complete ===")
+        try:
+            http_sock.close(); print("[i] HTTP socket closed")
+        except Exception:
+            pass
+        try:
+            ap.active(False); print("[i] AP disabled")
+        except Exception:
+            pass
+        try:
+            sta.active(False); print("[i] STA disabled")
+        except Exception:
+            pass
+        print("=== Shutdown complete ===")
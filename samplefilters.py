@@ -0,0 +1,297 @@
+import array
+
+from mathutils import sort_in_place, np, to_vector, store_vector, sliding_windows, median_rows
+
+# Streaming filter stages for raw u16 ADC probes. Every stage takes one sample
+# at a time through push() and keeps only a fixed-size window, so memory is
+# bounded by the window (or group count), never by the number of samples.
+#
+# Transform stages (MedianFilter, HampelFilter, TrimmedMeanFilter) return the
+# filtered sample from push(). Estimators (MedianOfMeans) absorb samples and
+# report a single value(). Stages compose through FilterChain.
+#
+# For whole buffers, apply() / estimate() give the same results as pushing
+# sample by sample. When mathutils has a vectorised backend (ulab or NumPy)
+# they run as array operations; only the first window fills sample by sample.
+
+def _zeros(size : int) -> array.array :
+    return array.array('H', (0 for _ in range(size)))
+
+def _apply_streaming(stage, data, start : int = 0, end : int = -1) :
+    if end < 0:
+        end = len(data)
+    for i in range(start, end):
+        data[i] = stage.push(data[i])
+
+def _insert_sorted(data, count : int, value : int) :
+    lo = 0
+    hi = count
+    while lo < hi:
+        mid = (lo + hi) >> 1
+        if data[mid] < value:
+            lo = mid + 1
+        else:
+            hi = mid
+    for i in range(count, lo, -1):
+        data[i] = data[i - 1]
+    data[lo] = value
+
+def _remove_sorted(data, count : int, value : int) :
+    lo = 0
+    hi = count
+    while lo < hi:
+        mid = (lo + hi) >> 1
+        if data[mid] < value:
+            lo = mid + 1
+        else:
+            hi = mid
+    for i in range(lo, count - 1):
+        data[i] = data[i + 1]
+
+class SortedWindow:
+    # The last `size` samples, held in arrival order (ring) and in sorted order.
+    # Binary search finds the slot, so an update is O(log w) compares plus a shift.
+    def __init__(self, size : int) -> None :
+        if size < 1:
+            raise ValueError("window size must be at least 1")
+        self._ring = _zeros(size)
+        self._sorted = _zeros(size)
+        self._size = size
+        self.reset()
+
+    def reset(self) :
+        self._count = 0
+        self._head = 0
+
+    def __len__(self) -> int :
+        return self._count
+
+    def capacity(self) -> int :
+        return self._size
+
+    def push(self, value : int) :
+        if self._count == self._size:
+            _remove_sorted(self._sorted, self._count, self._ring[self._head])
+            self._count -= 1
+        self._ring[self._head] = value
+        self._head = (self._head + 1) % self._size
+        _insert_sorted(self._sorted, self._count, value)
+        self._count += 1
+
+    def median(self) -> int :
+        if self._count == 0:
+            raise ValueError("empty window")
+        n = self._count
+        if n & 1:
+            return self._sorted[n >> 1]
+        return (self._sorted[(n >> 1) - 1] + self._sorted[n >> 1]) >> 1
+
+    def trimmed_mean(self, trim : int) -> int :
+        n = self._count
+        if n == 0:
+            raise ValueError("empty window")
+        if 2 * trim >= n:
+            return self.median()
+        total = 0
+        for i in range(trim, n - trim):
+            total += self._sorted[i]
+        return total // (n - 2 * trim)
+
+    def sorted_view(self) -> memoryview :
+        return memoryview(self._sorted)[:self._count]
+
+class MedianFilter:
+    def __init__(self, window : int = 5) -> None :
+        self._window = SortedWindow(window)
+
+    def reset(self) :
+        self._window.reset()
+
+    def push(self, value : int) -> int :
+        self._window.push(value)
+        return self._window.median()
+
+    def apply(self, data) :
+        # Filters a whole buffer in place, starting from an empty window
+        self.reset()
+        window = self._window.capacity()
+        if np is None or len(data) <= window:
+            _apply_streaming(self, data)
+            return
+        vector = to_vector(data, True)
+        _apply_streaming(self, data, 0, window - 1)
+        store_vector(median_rows(sliding_windows(vector, window)), data, window - 1)
+
+class TrimmedMeanFilter:
+    # Mean of the window after dropping `trim` samples from each end
+    def __init__(self, window : int = 9, trim : int = 2) -> None :
+        if trim < 0 or 2 * trim >= window:
+            raise ValueError("trim must leave at least one sample in the window")
+        self._window = SortedWindow(window)
+        self._trim = trim
+
+    def reset(self) :
+        self._window.reset()
+
+    def push(self, value : int) -> int :
+        self._window.push(value)
+        return self._window.trimmed_mean(self._trim)
+
+    def apply(self, data) :
+        # Filters a whole buffer in place, starting from an empty window
+        self.reset()
+        window = self._window.capacity()
+        if np is None or len(data) <= window:
+            _apply_streaming(self, data)
+            return
+        vector = to_vector(data, True)
+        _apply_streaming(self, data, 0, window - 1)
+        ordered = np.sort(sliding_windows(vector, window), axis=1)
+        kept = window - 2 * self._trim
+        store_vector(np.floor(np.sum(ordered[:, self._trim:window - self._trim], axis=1) / kept), data, window - 1)
+
+class HampelFilter:
+    # Causal Hampel identifier: a sample further than `threshold` scaled MADs from
+    # the median of the preceding window is replaced by that median. The original
+    # sample still enters the window, so a genuine level shift is accepted once it
+    # dominates the window.
+    MAD_SCALE = 1.4826  # MAD -> standard deviation for normally distributed noise
+
+    def __init__(self, window : int = 7, threshold : float = 3.0) -> None :
+        self._window = SortedWindow(window)
+        self._deviations = _zeros(window)
+        self._deviations_view = memoryview(self._deviations)
+        # Fixed point (x1000) so the per-sample outlier test stays in integers
+        self._limit_milli = int(threshold * self.MAD_SCALE * 1000 + 0.5)
+        self.rejected : int = 0
+
+    def reset(self) :
+        self._window.reset()
+        self.rejected = 0
+
+    def _mad(self, median : int) -> int :
+        window = self._window.sorted_view()
+        n = len(window)
+        deviations = self._deviations_view[:n]
+        for i in range(n):
+            deviations[i] = abs(window[i] - median)
+        sort_in_place(deviations)
+        if n & 1:
+            return deviations[n >> 1]
+        return (deviations[(n >> 1) - 1] + deviations[n >> 1]) >> 1
+
+    def push(self, value : int) -> int :
+        out = value
+        if len(self._window) >= 3:
+            median = self._window.median()
+            if abs(value - median) * 1000 > self._limit_milli * self._mad(median):
+                out = median
+                self.rejected += 1
+        self._window.push(value)
+        return out
+
+    def apply(self, data) :
+        # Filters a whole buffer in place, starting from an empty window
+        self.reset()
+        window = self._window.capacity()
+        if np is None or len(data) <= window:
+            _apply_streaming(self, data)
+            return
+        vector = to_vector(data, True)
+        _apply_streaming(self, data, 0, window)
+
+        # Row j is the window preceding sample j + window
+        windows = sliding_windows(vector[:-1], window)
+        median = median_rows(windows)
+        deviations = np.zeros(windows.shape, dtype=windows.dtype)
+        for k in range(window):
+            deviations[:, k] = abs(windows[:, k] - median)
+        mad = median_rows(deviations)
+        samples = vector[window:]
+        outlier = abs(samples - median) * 1000 > self._limit_milli * mad
+        self.rejected += int(np.sum(outlier))
+        store_vector(np.where(outlier, median, samples), data, window)
+
+class MedianOfMeans:
+    # Samples are averaged in consecutive groups of `group_size`; the estimate is
+    # the median of the group means, so one glitch can spoil at most one group.
+    # Memory is one u16 per group. Samples beyond max_groups full groups are
+    # folded into the last group, which then averages all of them.
+    def __init__(self, group_size : int = 10, max_groups : int = 16) -> None :
+        if group_size < 1 or max_groups < 1:
+            raise ValueError("group_size and max_groups must be at least 1")
+        self._group_size = group_size
+        self._means = _zeros(max_groups)
+        self.reset()
+
+    def reset(self) :
+        self._groups = 0
+        self._sum = 0
+        self._in_group = 0
+
+    def push(self, value : int) :
+        self._sum += value
+        self._in_group += 1
+        # The last group stays open and takes whatever else is pushed
+        if self._in_group == self._group_size and self._groups < len(self._means) - 1:
+            self._means[self._groups] = self._sum // self._group_size
+            self._groups += 1
+            self._sum = 0
+            self._in_group = 0
+
+    def value(self) -> int :
+        groups = self._groups
+        if self._in_group >= self._group_size:
+            self._means[groups] = self._sum // self._in_group
+            groups += 1
+        means = memoryview(self._means)[:groups]
+        if groups == 0:
+            # Fewer samples than a single group, fall back to their plain mean
+            if self._in_group == 0:
+                raise ValueError("no samples")
+            return self._sum // self._in_group
+        sort_in_place(means)
+        if groups & 1:
+            return means[groups >> 1]
+        return (means[(groups >> 1) - 1] + means[groups >> 1]) >> 1
+
+    def estimate(self, data) -> int :
+        # Same result as reset(), push() of every sample, then value()
+        size = self._group_size
+        groups = len(data) // size
+        if np is None or groups == 0:
+            self.reset()
+            for value in data:
+                self.push(value)
+            return self.value()
+        vector = to_vector(data, True)
+        end = groups * size
+        if groups >= len(self._means):
+            groups = len(self._means)
+            end = len(data)
+        head = (groups - 1) * size
+        means = np.zeros(groups)
+        if groups > 1:
+            means[:groups - 1] = np.floor(np.sum(vector[:head].reshape((groups - 1, size)), axis=1) / size)
+        means[groups - 1] = np.floor(np.sum(vector[head:end]) / (end - head))
+        return int(median_rows(means.reshape((1, groups)))[0])
+
+class FilterChain:
+    # Runs transform stages in order; the output of one feeds the next
+    def __init__(self, *stages) -> None :
+        self._stages = stages
+
+    def reset(self) :
+        for stage in self._stages:
+            stage.reset()
+
+    def push(self, value : int) -> int :
+        for stage in self._stages:
+            value = stage.push(value)
+        return value
+
+    def apply(self, data) :
+        # Every stage is causal, so running them one after another over the
+        # whole buffer equals pushing each sample through the chain
+        for stage in self._stages:
+            stage.apply(data)
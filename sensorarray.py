@@ -0,0 +1,70 @@
+import asyncio
+from time import ticks_us, ticks_add, ticks_diff
+
+from logger import log
+from soilmoisturesensor import SoilMoistureSensor
+
+class SensorArray:
+    # Measures several SoilMoistureSensor probes inside a single acquisition
+    # window: all power pins go up together, one settle delay is paid, and the
+    # probes are read round-robin, so N probes take about as long as one.
+    # Each probe keeps its own buffer, oversampling, filters and calibration.
+    # main.py drives a single probe and does not use it; a multi-probe build
+    # passes the result to HomeAssistantClient.publish_soil_moisture_array.
+    def __init__(self, sensors : list, probe_count : int = 40, mode : int = SoilMoistureSensor.BURST,
+                 probe_interval : float = 0.2, burst_period_us : int = 0) -> None:
+        if not sensors:
+            raise ValueError("SensorArray needs at least one sensor")
+
+        self._sensors = sensors
+        self._probe_count : int = probe_count
+        self._mode : int = mode
+        self._probe_interval : float = probe_interval
+        self._burst_period_us : int = burst_period_us
+
+        # Probes may share a power pin, each distinct pin is switched once
+        self._power_pins = []
+        for sensor in sensors:
+            if not any(pin is sensor.sensor_power for pin in self._power_pins):
+                self._power_pins.append(sensor.sensor_power)
+        self._settle_time : float = max(sensor.settle_time for sensor in sensors)
+
+        self._buffers = [sensor.sample_buffer(probe_count) for sensor in sensors]
+        self._results = [0 for _ in sensors]
+
+    def _set_power(self, value : int) :
+        for pin in self._power_pins:
+            pin.value(value)
+
+    async def _acquire(self) :
+        sensors = self._sensors
+        buffers = self._buffers
+        count = len(sensors)
+        period_us = self._burst_period_us
+        burst = self._mode == SoilMoistureSensor.BURST
+
+        self._set_power(1)
+        try:
+            await asyncio.sleep(self._settle_time)  # Wait for sensors to stabilize
+            deadline = ticks_us()
+            for i in range(self._probe_count):
+                for j in range(count):
+                    buffers[j][i] = sensors[j].read_probe()
+                if not burst:
+                    await asyncio.sleep(self._probe_interval)
+                elif period_us:
+                    deadline = ticks_add(deadline, period_us)
+                    while ticks_diff(deadline, ticks_us()) > 0:
+                        pass
+        finally:
+            self._set_power(0)
+
+    # Returns one percentage per sensor, in constructor order. The list is
+    # reused by the next call.
+    async def measure_soil_moisture(self) -> list :
+        await self._acquire()
+        for j, sensor in enumerate(self._sensors):
+            raw_moisture_probes = sensor.finish_measurement(self._probe_count, self._probe_count)
+            self._results[j] = sensor.moisture_percentage(raw_moisture_probes)
+        log.debug("Measured soil moisture array: %s", self._results)
+        return self._results
@@ -1,84 +1,260 @@
 from machine import Pin, ADC as AADC
 import asyncio
 import array
+import time
 
-from logger import log
-from fileutils import JsonFileUtil
-from mathutils import average, percentile, percentage_in_bounds
+from logger import log, Logger
+from fileutils import JsonFileUtil, BinaryFileUtil
+from mathutils import SampleStats, RunningStats, Histogram, isqrt
+from kernels import sum_u16, sumsq_u16
+from measurement import Measurement
+from calibration import CalibrationCurve
+
+DEBUG_SORT_LIMIT = 256  # Probes up to which debug quantiles sort a copy instead of binning
 
 class SoilMoistureSensor:
-    async def _do_measurement(self, probe_count : int = 100, probe_interval : float = 0.2) -> array.array :
-        raw_moisture_probes = array.array('H')  # Array of unsigned short (16-bit) integers
+    # Acquisition modes
+    PACED = 0  # One read per probe_interval, yielding to the event loop in between
+    BURST = 1  # Tight timer-paced burst of oversampled reads, probe is powered briefly
+
+    async def _do_measurement(self, probe_count : int = 100, probe_interval : float = 0.2) -> memoryview :
+        raw_moisture_probes = self.sample_buffer(probe_count)
+
+        adaptive = self._tolerance > 0
+        if adaptive:
+            self._running_stats.reset()
+
+        used_count = probe_count
         self._sensor_power.value(1)  
-        await asyncio.sleep(1)  # Wait for sensor to stabilize
-        for _ in range(probe_count):
-            raw_probe = self._sensor.read_u16(last=False)
-            raw_moisture_probes.append(raw_probe)
-            await asyncio.sleep(probe_interval)
-        self._sensor_power.value(0)  
-        log.debug(f"Raw moisture probes: {raw_moisture_probes}")
-        log.debug(f"Min: {min(raw_moisture_probes)}, "
-                  f"Max: {max(raw_moisture_probes)}, "
-                  f"Avg: {average(raw_moisture_probes)}, "
-                  f"P25: {percentile(raw_moisture_probes, 25)}, "
-                  f"P50: {percentile(raw_moisture_probes, 50)}, "
-                  f"P75: {percentile(raw_moisture_probes, 75)}, "
-                  f"P95: {percentile(raw_moisture_probes, 95)}")
-        return raw_moisture_probes
+        try:
+            await asyncio.sleep(self._settle_time)  # Wait for sensor to stabilize
+            if self._mode == self.BURST:
+                used_count = self._sensor.read_burst(raw_moisture_probes, self._oversample, self._burst_period_us,
+                                                     self._is_converged if adaptive else None)
+            else:
+                samples = self._samples
+                for i in range(probe_count):
+                    samples[i] = self.read_probe()
+                    if adaptive and self._is_converged(samples[i]):
+                        used_count = i + 1
+                        break
+                    await asyncio.sleep(probe_interval)
+        finally:
+            self._sensor_power.value(0)  
+
+        return self.finish_measurement(used_count, probe_count)
+
+    def _estimate_raw_level(self, raw_moisture_probes : memoryview) -> int :
+        if self._estimator is None:
+            raw_level = sum_u16(raw_moisture_probes) // len(raw_moisture_probes)
+        else:
+            raw_level = self._estimator.estimate(raw_moisture_probes)
+
+        if log.enabled_for(Logger.DEBUG):
+            log.debug("%s", self._debug_stats(raw_moisture_probes))
+        return raw_level
+
+    def _debug_stats(self, raw_moisture_probes : memoryview) -> SampleStats :
+        # The probe buffer is left in acquisition order: a few hundred probes are
+        # sorted as a copy, more are binned. Buffers are allocated on first use.
+        n = len(raw_moisture_probes)
+        if n <= DEBUG_SORT_LIMIT:
+            if self._debug_scratch is None:
+                self._debug_scratch = array.array('H', (0 for _ in range(len(self._samples))))
+            scratch = memoryview(self._debug_scratch)[:n]
+            scratch[:] = raw_moisture_probes
+            return SampleStats(scratch, (25, 50, 75, 95))
+        if self._debug_histogram is None:
+            self._debug_histogram = Histogram()
+        self._debug_histogram.reset()
+        return SampleStats(raw_moisture_probes, (25, 50, 75, 95), self._debug_histogram)
+
+    def _raw_to_percentage(self, raw_level : int) -> int :
+        # Fixed point end to end: the table yields tenths of a percent, rounded
+        # here to the nearest whole percent
+        self.last_moisture_permille = self._calibration.convert(raw_level)
+        return (self.last_moisture_permille + CalibrationCurve.SCALE // 2) // CalibrationCurve.SCALE
+
+    def _is_converged(self, raw_probe : int) -> bool :
+        stats = self._running_stats
+        stats.add(raw_probe)
+        return stats.count >= self._min_probe_count and stats.converged(self._tolerance, self._confidence_z)
+
+    def __init__(self, sensor : AADC, sensor_power : Pin, probe_count : int = 100, probe_interval : float = 0.2,
+                 mode : int = PACED, oversample : int = 1, burst_period_us : int = 0, settle_time : float = 1,
+                 tolerance : float = 0, min_probe_count : int = 10, confidence_z : float = 1.96,
+                 sample_filter = None, estimator = None, recorder = None) -> None:
+        if oversample < 1:
+            raise ValueError("oversample must be at least 1")
+        if tolerance > 0 and (min_probe_count < 2 or min_probe_count > probe_count):
+            raise ValueError("min_probe_count must be between 2 and probe_count")
 
-    def __init__(self, sensor : AADC, sensor_power : Pin, probe_count : int = 100, probe_interval : float = 0.2) -> None:
         self._sensor = sensor
         self._sensor_power = sensor_power
 
         self._probe_count : int = probe_count
         self._probe_interval : float = probe_interval
 
+        self._mode : int = mode
+        self._oversample : int = oversample
+        self._burst_period_us : int = burst_period_us
+        self._settle_time : float = settle_time
+
+        # Adaptive sampling: with tolerance > 0 (raw ADC units) acquisition stops as soon
+        # as the confidence interval of the mean is that narrow; probe_count is the cap
+        self._tolerance : float = tolerance
+        self._min_probe_count : int = min_probe_count
+        self._confidence_z : float = confidence_z
+        self._running_stats = RunningStats()
+        self.last_probe_count : int = 0
+        self.last_raw_level : int = -1
+        self.last_spread : int = 0
+        self.last_moisture_permille : int = -1  # Tenths of a percent of the latest measurement
+
+        # Optional robust processing (see samplefilters): sample_filter rewrites the
+        # probes in place, estimator replaces the plain average of the probes
+        self._sample_filter = sample_filter
+        self._estimator = estimator
+        # Optional adctrace.TraceRecorder, captures the raw probes of every cycle
+        self.recorder = recorder
+        self._debug_histogram = None  # Allocated on first use, only when DEBUG logging is on
+        self._debug_scratch = None
+
+        # Preallocated once and refilled by index on every measurement
+        self._samples = array.array('H', (0 for _ in range(probe_count)))  # Array of unsigned short (16-bit) integers
+        self._samples_view = memoryview(self._samples)
+
         self._left_bound : int = 65535
         self._right_bound : int = 0
+        self._calibration_points : list = []  # (raw, percent) pairs strictly between the bounds
+        self._rebuild_calibration()
 
         self._settings_file = JsonFileUtil("HD-38-sensor-calibration.json")
+        self._table_file = BinaryFileUtil("HD-38-sensor-calibration.lut")
+
+    def _rebuild_calibration(self) :
+        # Dry bound is 0 %, wet bound is 100 %, calibrate_point adds the ones in between
+        curve = CalibrationCurve([(self._left_bound, 0), (self._right_bound, 100)] + self._calibration_points)
+        curve.compile()
+        self._calibration = curve
 
     async def calibrate_dry_soil(self) :
         raw_moisture_probes = await self._do_measurement(self._probe_count, self._probe_interval)
-        self._left_bound = int(average(raw_moisture_probes))
+        self._left_bound = self._estimate_raw_level(raw_moisture_probes)
 
         if self._left_bound < self._right_bound:
             raise Exception("Invalid calibration values. Left bound must be greater than right bound.")
 
-        log.debug(f"Calibration dry soil completed. Left bound: {self._left_bound}, Right bound: {self._right_bound}")
+        self._rebuild_calibration()
+        log.debug("Calibration dry soil completed. Left bound: %d, Right bound: %d", self._left_bound, self._right_bound)
         
     async def calibrate_wet_soil(self) :
         raw_moisture_probes = await self._do_measurement(self._probe_count, self._probe_interval)    
-        self._right_bound = int(average(raw_moisture_probes))
+        self._right_bound = self._estimate_raw_level(raw_moisture_probes)
 
         if self._left_bound < self._right_bound:
             raise Exception("Invalid calibration values. Right bound must be less than left bound.")
 
-        log.debug(f"Calibration wet soil completed. Left bound: {self._left_bound}, Right bound: {self._right_bound}")
+        self._rebuild_calibration()
+        log.debug("Calibration wet soil completed. Left bound: %d, Right bound: %d", self._left_bound, self._right_bound)
+
+    async def calibrate_point(self, percent : int) :
+        if percent <= 0 or percent >= 100:
+            raise ValueError("Intermediate calibration point must be between 0 and 100 percent.")
+
+        raw_moisture_probes = await self._do_measurement(self._probe_count, self._probe_interval)
+        raw_level = self._estimate_raw_level(raw_moisture_probes)
+        if raw_level > self._left_bound or raw_level < self._right_bound:
+            raise Exception("Invalid calibration value. Point must lie between the dry and wet bounds.")
+
+        previous = self._calibration_points
+        self._calibration_points = [p for p in previous if p[1] != percent] + [(raw_level, percent)]
+        try:
+            self._rebuild_calibration()
+        except ValueError:
+            self._calibration_points = previous
+            raise
+        log.debug("Calibration point %d%% completed. Raw: %d", percent, raw_level)
+
+    async def measure(self, probe_count : int = 0) -> Measurement :
+        # probe_count overrides the configured count for this reading, up to the buffer size
+        start = time.ticks_ms()
+        raw_moisture_probes = await self._do_measurement(probe_count or self._probe_count, self._probe_interval)    
+        percent = self.moisture_percentage(raw_moisture_probes)
+        return Measurement(int(time.time()), self.last_raw_level, percent, self.last_spread, self.last_probe_count,
+                           time.ticks_diff(time.ticks_ms(), start))
 
     async def measure_soil_moisture(self) -> int:
-        raw_moisture_probes = await self._do_measurement(self._probe_count, self._probe_interval)    
-        moisture_level = int(average(raw_moisture_probes))
-        moisture_percentage = int(percentage_in_bounds(moisture_level, self._left_bound, self._right_bound))
-        
-        log.debug(f"Measured soil moisture: {moisture_level}, Percentage: {moisture_percentage}")
+        return (await self.measure()).percent
+
+    # Building blocks of a measurement, also driven by SensorArray when several
+    # probes share one acquisition window
+
+    @property
+    def sensor_power(self) -> Pin :
+        return self._sensor_power
+
+    @property
+    def settle_time(self) -> float :
+        return self._settle_time
+
+    def sample_buffer(self, probe_count : int) -> memoryview :
+        if probe_count > len(self._samples):
+            raise ValueError("probe_count exceeds sample buffer capacity")
+        # Steady state hands out the cached full-size view, nothing is allocated
+        return self._samples_view if probe_count == len(self._samples) else self._samples_view[:probe_count]
+
+    def read_probe(self) -> int :
+        if self._oversample == 1:
+            return self._sensor.read_u16(last=False)
+        return self._sensor.read_oversampled(self._oversample)
+
+    def finish_measurement(self, used_count : int, probe_count : int) -> memoryview :
+        raw_moisture_probes = self.sample_buffer(used_count)
+        self.last_probe_count = used_count
+        if used_count < probe_count:
+            log.debug("Signal converged after %d of %d probes", used_count, probe_count)
+
+        log.debug(lambda: f"Raw moisture probes: {array.array('H', raw_moisture_probes)}")
+        if self.recorder is not None:
+            period_us = self._burst_period_us if self._mode == self.BURST else int(self._probe_interval * 1000000)
+            self.recorder.record(raw_moisture_probes, period_us, int(time.time()), self._mode)
+        if self._sample_filter is not None:
+            self._sample_filter.apply(raw_moisture_probes)
+        return raw_moisture_probes
+
+    def moisture_percentage(self, raw_moisture_probes : memoryview) -> int :
+        n = len(raw_moisture_probes)
+        total = sum_u16(raw_moisture_probes)
+        self.last_spread = isqrt((n * sumsq_u16(raw_moisture_probes) - total * total) // (n * n))
+
+        moisture_level = self._estimate_raw_level(raw_moisture_probes)
+        self.last_raw_level = moisture_level
+        moisture_percentage = self._raw_to_percentage(moisture_level)
+
+        log.debug("Measured soil moisture: %d, Percentage: %d", moisture_level, moisture_percentage)
         return moisture_percentage
     
     def reset(self):
         self._left_bound = 65535
         self._right_bound = 0
+        self._calibration_points = []
+        self._rebuild_calibration()
         log.debug("Calibration reset to default values")
         if self._settings_file.delete() is True:
             log.debug("Calibration settings file deleted")
         else:
             log.debug("No calibration settings file to delete")
+        self._table_file.delete()
 
     def store_calibration_settings(self):
         self._settings_file.rewrite({
             "left": self._left_bound,
-            "right": self._right_bound
+            "right": self._right_bound,
+            "points": [[raw, percent] for raw, percent in self._calibration_points]
         })
-        log.debug(f"Calibration settings saved. Left bound: {self._left_bound}, Right bound: {self._right_bound}")
+        self._calibration.save_table(self._table_file)
+        log.debug("Calibration settings saved. Left bound: %d, Right bound: %d", self._left_bound, self._right_bound)
 
     def load_calibration_settings(self) -> bool :
         data = self._settings_file.read()
@@ -88,6 +264,17 @@ class SoilMoistureSensor:
         
         self._left_bound = int(data.get("left", self._left_bound))
         self._right_bound = int(data.get("right", self._right_bound))
-        log.debug(f"Calibration settings loaded. Left={self._left_bound}, Right={self._right_bound}")
+        self._calibration_points = [(int(raw), int(percent)) for raw, percent in data.get("points", [])]
+
+        try:
+            curve = CalibrationCurve([(self._left_bound, 0), (self._right_bound, 100)] + self._calibration_points)
+        except ValueError as e:
+            log.warning("Stored calibration is invalid: %s", e)
+            return False
+        # A stored table saves recompiling the curve; one that is missing or stale is rebuilt and stored again
+        if not curve.load_table(self._table_file):
+            curve.compile()
+            curve.save_table(self._table_file)
+        self._calibration = curve
+        log.debug("Calibration settings loaded. Left=%d, Right=%d, Points=%d", self._left_bound, self._right_bound, len(self._calibration_points))
         return True
-    
\ No newline at end of file
@@ -1,24 +1,33 @@
 import asyncio  
 import array
+import time
 
 from logger import log
 from homeassistantclient import HomeAssistantClient
 from controlbutton import ControlButton
 from statusled import StatusLed
 from soilmoisturesensor import SoilMoistureSensor
+from measurementcache import MeasurementCache
+from measurement import Measurement, MeasurementHistory
+from measurementjournal import MeasurementJournal
 
 
 class StateController:
-    def __init__(self, ha_client : HomeAssistantClient, button : ControlButton, led : StatusLed, soilSensor : SoilMoistureSensor, wakeup_interval : float = 100) -> None:
+    def __init__(self, ha_client : HomeAssistantClient, button : ControlButton, led : StatusLed, soilSensor : SoilMoistureSensor, wakeup_interval : float = 100, history_size : int = 96, journal_drain_interval : float = 2, calibration_points : tuple = ()) -> None:
         self._in_progress = False
         self._is_calibrated = False
-        self._last_measurement = -1
 
         self._ha_client = ha_client
         self._button = button
         self._led = led
         self._soilSensor = soilSensor
         self._wakeup_interval = wakeup_interval
+        self.history = MeasurementHistory(history_size)
+        self._measurements = MeasurementCache(soilSensor, self.history)
+        self._journal = MeasurementJournal()
+        self._journal_drain_interval = journal_drain_interval  # Seconds between journal batches
+        self._draining = False
+        self._calibration_points = calibration_points  # Percentages calibrated after the wet soil, one button press each
 
     async def run(self):
         try:
@@ -27,6 +36,7 @@ class StateController:
 
             self._led.connecting_to_network()
             await self._ha_client.connect()
+            self._ha_client.subscribe_reconnect(self._drain_journal)
 
             self._button.subscribe_long_press(self.calibrate_device)
             self._button.subscribe_double_press(self.last_measurement)
@@ -38,6 +48,7 @@ class StateController:
                 await self.calibrate_device()
                 self._in_progress = True
 
+            self._drain_journal()
             log.info("Device is ready, running main loop")
             self._led.device_ready()
             await asyncio.sleep(5)
@@ -49,7 +60,7 @@ class StateController:
                 await self.measure_soil_moisture()
             
         except Exception as e:
-            log.error(e)
+            log.error("%s", e)
             self._led.fatal_error()
             await asyncio.sleep(5)
             raise
@@ -63,7 +74,8 @@ class StateController:
             log.warning("Reject, anther operation is in progress")
             return
         
-        if self._last_measurement < 0 :
+        # Readings of the periodic loop are shown as is; the slack covers a wakeup still in progress
+        if not self._measurements.is_fresh(2 * self._wakeup_interval) :
             await self.measure_soil_moisture()
         else:
             try:
@@ -71,11 +83,11 @@ class StateController:
                 log.info("Displaying last measurement")
                 if self._is_calibrated is False:
                     raise Exception("Device is not calibrated")
-                self._led.soil_moisture(self._last_measurement, 0, 100)
+                self._led.soil_moisture(self._measurements.value, 0, 100)
                 await asyncio.sleep(5)
     
             except Exception as e:
-                log.error(e)
+                log.error("%s", e)
                 self._led.user_error()
                 await asyncio.sleep(5)
 
@@ -100,20 +112,28 @@ class StateController:
 
             self._led.calibrating_soil_moisture_when_dry()
             await self._soilSensor.calibrate_dry_soil()
-            self._last_measurement = 0
+            self._measurements.update(Measurement(int(time.time()), percent=0), record=False)
 
             self._led.start_calibration_soil_moisture_when_wet()
             await self._button.wait_press()
 
             self._led.calibrating_soil_moisture_when_wet()
             await self._soilSensor.calibrate_wet_soil()
-            self._last_measurement = 100
+            self._measurements.update(Measurement(int(time.time()), percent=100), record=False)
+
+            for percent in self._calibration_points:
+                self._led.start_calibration_soil_moisture_at(percent)
+                await self._button.wait_press()
+
+                self._led.calibrating_soil_moisture_at(percent)
+                await self._soilSensor.calibrate_point(percent)
+                self._measurements.update(Measurement(int(time.time()), percent=percent), record=False)
 
             self._soilSensor.store_calibration_settings()
             self._is_calibrated = True
 
         except Exception as e:
-            log.error(e)
+            log.error("%s", e)
             self._led.user_error()
             await asyncio.sleep(5)
 
@@ -133,18 +153,45 @@ class StateController:
                 raise Exception("Device is not calibrated")
 
             self._led.measuring_soil_moisture()
-            self._last_measurement = await self._soilSensor.measure_soil_moisture()
-            
-            self._led.soil_moisture(self._last_measurement, 0, 100)
-            self._ha_client.publish_soil_moisture(self._last_measurement)
+            measurement = await self._measurements.get(max_age=0)
+            moisture = measurement.percent
+
+            self._led.soil_moisture(moisture, 0, 100)
+            try:
+                await self._ha_client.publish_soil_moisture(moisture)
+                self._drain_journal()
+            except Exception as e:
+                # Offline: the reading is kept on flash and goes out once publishing works again
+                log.warning("Publishing failed, journaling the reading: %s", e)
+                self._journal.append(measurement.timestamp, 0, moisture)
             await asyncio.sleep(5)
 
         except Exception as e:
-            log.error(e)
+            log.error("%s", e)
             self._led.user_error()
             await asyncio.sleep(5)
 
         finally:
             self._led.idle()
             self._in_progress = False
-            
\ No newline at end of file
+
+    def _drain_journal(self):
+        if self._draining or not len(self._journal):
+            return
+        self._draining = True
+        asyncio.create_task(self._drain_journal_task())
+
+    async def _drain_journal_task(self):
+        # Batches go out one at a time with a pause in between, so a long backlog does not flood the broker
+        try:
+            log.info("Draining %d journaled readings", len(self._journal))
+            while len(self._journal):
+                count = self._journal.read_batch()
+                await self._ha_client.publish_soil_moisture_history([self._journal.record(i) for i in range(count)])
+                self._journal.consume(count)
+                if len(self._journal):
+                    await asyncio.sleep(self._journal_drain_interval)
+        except Exception as e:
+            log.warning("Journal drain stopped, %d readings left: %s", len(self._journal), e)
+        finally:
+            self._draining = False
@@ -1,9 +1,14 @@
+from machine import Pin, PWM
 from picozero.picozero import RGBLED
 
 class StatusLed :
     def __init__(self, led : RGBLED) -> None:
         self._led = led
         self._led.off()
+        # Handles on the PWM channels picozero already drives, so a steady colour is set with integer
+        # duty cycles instead of picozero's 0..1 floats; the LED must be constructed with pwm=True
+        self._pwm = tuple(PWM(Pin(pin)) for pin in led.pins)
+        self._active_high = led.active_high
 
     def idle(self):
         self._led.off()
@@ -12,9 +17,16 @@ class StatusLed :
         if moisture_level < left_bound or moisture_level > right_bound :
             raise Exception("Out of bounds")
         
-        green = (255 / 100) * moisture_level
+        # Integer-only so a steady-state update does not box any floats
+        green = 255 * moisture_level // 100
         red = 255 - green
-        self._led.color = (red, green, 0)
+        self._led.off()  # Stops any blink or pulse still running
+        self._set_color_u8(red, green, 0)
+
+    def _set_color_u8(self, red : int, green : int, blue : int):
+        for pwm, level in zip(self._pwm, (red, green, blue)):
+            duty = level * 257  # 0..255 onto 0..65535
+            pwm.duty_u16(duty if self._active_high else 65535 - duty)
 
     def start_calibration_soil_moisture_when_dry(self):
         self._led.blink(on_times=0.2, colors=((1,0,0), (0,0,0)))
@@ -28,6 +40,13 @@ class StatusLed :
     def calibrating_soil_moisture_when_wet(self):
         self._led.pulse(colors=((0, 0, 0), (0, 1, 0)))
 
+    def start_calibration_soil_moisture_at(self, percent : int):
+        # Blinks in the colour soil_moisture() shows for that percentage
+        self._led.blink(on_times=0.2, colors=((1 - percent / 100, percent / 100, 0), (0,0,0)))
+
+    def calibrating_soil_moisture_at(self, percent : int):
+        self._led.pulse(colors=((0, 0, 0), (1 - percent / 100, percent / 100, 0)))
+
     def measuring_soil_moisture(self):
         self._led.cycle(fade_times=0.7, colors=((1,0,0), (0,1,0)), fps=100)
 